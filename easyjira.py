@@ -12,6 +12,56 @@ import textwrap
 import getpass
 import re
 import datetime
+import gzip
+import io
+import concurrent.futures
+import csv
+import string
+import threading
+import time
+import copy
+import collections
+import itertools
+import hashlib
+import shutil
+import configparser
+import shlex
+import sqlite3
+import http.server
+import hmac
+try:
+    import resource
+except ImportError:
+    # not available on all platforms, only used to report peak memory
+    resource = None
+
+# optional faster JSON backends, stdlib json is used when none is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+# optional zstd compression of output and cache files, gzip is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# security tracker labels and summaries, e.g. labels CVE-2023-1234 and flaw:bz#2170000,
+# summary "CVE-2023-1234 openssl: some flaw [rhel-9.2.0]"
+CVE_LABEL_PREFIX = 'CVE-'
+FLAW_BZ_LABEL_PREFIX = 'flaw:bz#'
+STREAM_SUFFIX_RE = re.compile(r'\s*\[rhel.*\]\s*$')
+STREAM_RE = re.compile(r'\[(rhel[^\[\]]*)\]\s*$')
+CVE_IN_TEXT_RE = re.compile(r'\s*CVE-[0-9]*-[0-9]*\s*')
+CVE_ID_RE = re.compile(r'^CVE-([0-9]+)-([0-9]+)$')
+# tokens of the JQL subset evaluated locally: quoted strings, operators and parentheses, words
+JQL_TOKEN_RE = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|(!=|>=|<=|=|>|<|\(|\)|,)|([^\s"\'(),=!<>~]+))')
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
 fake_data_dir = currentdir + '/tests'
@@ -24,6 +74,504 @@ class FakeResponse:
     def json(self):
         return self.text
 
+class Transition:
+    """
+    Compact record of one status change. Status names and keys are interned,
+    so many records share the same string objects.
+    """
+    __slots__ = ('key', 'from_status', 'to_status', 'timestamp', 'points')
+
+    def __init__(self, key, from_status, to_status, timestamp, points):
+        self.key = sys.intern(key)
+        self.from_status = sys.intern(from_status) if from_status else from_status
+        self.to_status = sys.intern(to_status) if to_status else to_status
+        self.timestamp = timestamp
+        self.points = points
+
+    def as_dict(self):
+        return {'key': self.key, 'from': self.from_status, 'to': self.to_status, 'timestamp': self.timestamp, 'points': self.points}
+
+class CachedResponse:
+    """
+    Response served from HttpCache, it offers the parts of requests.Response easyjira uses.
+    """
+    def __init__(self, entry):
+        self.status_code = entry['status_code']
+        self.reason = entry['reason']
+        self.headers = entry['headers']
+        self.content = entry['content']
+        self.ok = self.status_code < 400
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+class HttpCache:
+    """
+    Cache of GET responses of single issues (not of their sub-resources such as
+    transitions or editmeta, which change with the issue), a size-bounded LRU in memory with
+    an optional tier on disk (one directory per issue, so all cached resources
+    of an issue can be dropped at once when the issue is changed).
+
+    Entries with ETag or Last-Modified are revalidated by the caller using a
+    conditional request, other entries are used without asking the server
+    while they are younger than ttl seconds.
+    """
+    ISSUE_URL_RE = re.compile(r'^(.*/issue/(?!bulk\b|createmeta\b)([^/?]+))')
+    CACHEABLE_URL_RE = re.compile(r'^.*/issue/(?!bulk\b|createmeta\b)[^/?]+$')
+
+    def __init__(self, max_entries=256, ttl=60, directory=None, read_file=None, write_file=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._read_file = read_file or self._read_json_file
+        self._write_file = write_file or self._write_json_file
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue_key(self, url):
+        """
+        Returns the issue key for URLs of a single issue (or its sub-resources), None otherwise.
+        """
+        match = self.ISSUE_URL_RE.match(url)
+        return match.group(2) if match else None
+
+    def is_cacheable(self, url):
+        """
+        Returns whether responses of the URL may be cached, only the issue resource itself is.
+        """
+        return bool(self.CACHEABLE_URL_RE.match(url))
+
+    def _read_json_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_json_file(self, path, data):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(data))
+        os.replace(tmp_path, path)
+
+    def _disk_path(self, key):
+        issue_key = self.issue_key(key)
+        return os.path.join(self.directory, issue_key, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.directory:
+            return None
+        entry = self._read_file(self._disk_path(key))
+        if not entry:
+            return None
+        entry['content'] = entry['content'].encode('utf-8')
+        self._store_in_memory(key, entry)
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry['stored'] < self.ttl
+
+    def has_validators(self, entry):
+        return 'ETag' in entry['headers'] or 'Last-Modified' in entry['headers']
+
+    def _store_in_memory(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, response):
+        headers = {name: response.headers[name] for name in ('ETag', 'Last-Modified', 'Content-Type') if name in response.headers}
+        entry = {'status_code': response.status_code, 'reason': response.reason, 'headers': headers, 'content': response.content, 'stored': time.time()}
+        self._store_in_memory(key, entry)
+        if self.directory:
+            self._write_file(self._disk_path(key), dict(entry, content=entry['content'].decode('utf-8')))
+        return entry
+
+    def refresh(self, key, entry):
+        entry['stored'] = time.time()
+        self._store_in_memory(key, entry)
+
+    def invalidate(self, url):
+        """
+        Drops all cached resources of the issue the url belongs to.
+        """
+        match = self.ISSUE_URL_RE.match(url)
+        if not match:
+            return
+        prefix = match.group(1)
+        with self._lock:
+            for key in [key for key in self._entries if key == prefix or key.startswith((prefix + '/', prefix + '?'))]:
+                del self._entries[key]
+        if self.directory:
+            shutil.rmtree(os.path.join(self.directory, match.group(2)), ignore_errors=True)
+
+class RateLimiter:
+    """
+    Spaces started requests evenly, so at most rate requests per second are
+    started in total, no matter how many threads share the limiter.
+    """
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class IssueStore:
+    """
+    Local store of issues in a SQLite database with secondary indexes on fields
+    used by typical dashboard queries, so a subset of JQL can be answered
+    without asking the server. Whole issues are stored as JSON, the indexed
+    fields are extracted from them when an issue is stored. Projects are matched
+    by their key and name. Scopes (projects or queries) whose issues were all
+    stored are recorded with the time of the sync, only they can be answered locally.
+    """
+    TEXT_FIELDS = {'project': 'project', 'status': 'status', 'assignee': 'assignee', 'parent': 'parent',
+                   'key': 'key', 'issuekey': 'key', 'epic link': 'epic'}
+    DATE_FIELDS = {'updated': 'updated', 'created': 'created'}
+    LIST_FIELDS = {'labels': 'labels', 'component': 'components', 'components': 'components'}
+
+    COLUMNS = ('key', 'project', 'key_number', 'status', 'assignee', 'parent', 'epic', 'created', 'updated', 'data', 'project_name')
+
+    def __init__(self, path, epic_field=None, dumps=json.dumps, loads=json.loads):
+        self.epic_field = epic_field
+        self._dumps = dumps
+        self._loads = loads
+        if epic_field and epic_field.startswith('customfield_'):
+            # JQL refers to custom fields also as cf[12345]
+            self.TEXT_FIELDS = dict(self.TEXT_FIELDS, **{'cf[{}]'.format(epic_field[len('customfield_'):]): 'epic'})
+        os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(issues)')]
+            if columns and 'project_name' not in columns:
+                # stores created by older versions lack project names, they are filled when issues are stored again
+                self._db.execute('ALTER TABLE issues ADD COLUMN project_name TEXT COLLATE NOCASE')
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS issues (
+                    key TEXT PRIMARY KEY COLLATE NOCASE, project TEXT COLLATE NOCASE, key_number INTEGER,
+                    status TEXT COLLATE NOCASE, assignee TEXT COLLATE NOCASE, parent TEXT COLLATE NOCASE,
+                    epic TEXT COLLATE NOCASE, created REAL, updated REAL, data TEXT, project_name TEXT COLLATE NOCASE);
+                CREATE TABLE IF NOT EXISTS labels (key TEXT COLLATE NOCASE, value TEXT COLLATE NOCASE);
+                CREATE TABLE IF NOT EXISTS components (key TEXT COLLATE NOCASE, value TEXT COLLATE NOCASE);
+                CREATE TABLE IF NOT EXISTS syncs (scope TEXT PRIMARY KEY COLLATE NOCASE, synced REAL);
+                CREATE INDEX IF NOT EXISTS issues_project ON issues (project, key_number);
+                CREATE INDEX IF NOT EXISTS issues_project_name ON issues (project_name);
+                CREATE INDEX IF NOT EXISTS issues_status ON issues (status);
+                CREATE INDEX IF NOT EXISTS issues_assignee ON issues (assignee);
+                CREATE INDEX IF NOT EXISTS issues_parent ON issues (parent);
+                CREATE INDEX IF NOT EXISTS issues_epic ON issues (epic);
+                CREATE INDEX IF NOT EXISTS issues_updated ON issues (updated);
+                CREATE INDEX IF NOT EXISTS labels_value ON labels (value, key);
+                CREATE INDEX IF NOT EXISTS labels_key ON labels (key);
+                CREATE INDEX IF NOT EXISTS components_value ON components (value, key);
+                CREATE INDEX IF NOT EXISTS components_key ON components (key);
+            """)
+
+    def _timestamp(self, value):
+        if not value:
+            return None
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+
+    def _row(self, issue):
+        fields = issue.get('fields', {})
+        name = lambda value: (value or {}).get('name')
+        key_prefix, _, number = issue['key'].rpartition('-')
+        project = fields.get('project') or {}
+        return (issue['key'], project.get('key') or key_prefix, int(number) if number.isdigit() else None, name(fields.get('status')),
+                name(fields.get('assignee')), (fields.get('parent') or {}).get('key'), fields.get(self.epic_field) if self.epic_field else None,
+                self._timestamp(fields.get('created')), self._timestamp(fields.get('updated')), self._dumps(issue), project.get('name'))
+
+    def put(self, issues):
+        """
+        Stores issues, replacing stored versions of the same issues.
+        """
+        rows = [self._row(issue) for issue in issues]
+        labels = [(issue['key'], label) for issue in issues for label in issue.get('fields', {}).get('labels') or []]
+        components = [(issue['key'], component['name']) for issue in issues for component in issue.get('fields', {}).get('components') or []]
+        with self._lock, self._db:
+            self.delete([row[0] for row in rows], locked=True)
+            self._db.executemany(f'INSERT INTO issues ({", ".join(self.COLUMNS)}) VALUES ({", ".join("?" * len(self.COLUMNS))})', rows)
+            self._db.executemany('INSERT INTO labels VALUES (?, ?)', labels)
+            self._db.executemany('INSERT INTO components VALUES (?, ?)', components)
+
+    def delete(self, keys, locked=False):
+        """
+        Removes issues of given keys from the store.
+        """
+        if not locked:
+            with self._lock, self._db:
+                return self.delete(keys, locked=True)
+        for table in ('issues', 'labels', 'components'):
+            self._db.executemany(f'DELETE FROM {table} WHERE key = ?', [(key,) for key in keys])
+
+    def get(self, key):
+        """
+        Returns the stored issue of the given key, None if it is not stored.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT data FROM issues WHERE key = ?', (key,)).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def count(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM issues').fetchone()[0]
+
+    def project_keys(self, project):
+        """
+        Returns keys of stored projects of the given key or name, the given value if no issue of it is stored.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT DISTINCT project FROM issues WHERE project = ? OR project_name = ?', (project, project)).fetchall()
+        return [row[0] for row in rows] or [project]
+
+    def mark_synced(self, scope, synced):
+        """
+        Records that all issues of a scope ('project:KEY' or 'jql:CONDITION') were stored by a sync started at the given time.
+        """
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?)', (scope, synced))
+
+    def synced(self, scope):
+        """
+        Returns when the last full sync of a scope started, None if it was never synced.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT synced FROM syncs WHERE scope = ?', (scope,)).fetchone()
+        return row[0] if row else None
+
+    def _condition(self, field, operator, values):
+        """
+        Returns SQL condition and its parameters for one JQL clause.
+        """
+        marks = ', '.join('?' * len(values))
+        if field in self.LIST_FIELDS:
+            table = self.LIST_FIELDS[field]
+            matching = f'key IN (SELECT key FROM {table} WHERE value IN ({marks}))'
+            if operator in ('=', 'in'):
+                return matching, values
+            # like Jira, issues without any value do not match negative conditions either
+            return f'NOT {matching} AND key IN (SELECT key FROM {table})', values
+        column = self.TEXT_FIELDS.get(field) or self.DATE_FIELDS[field]
+        if column == 'project':
+            # JQL accepts both the key and the name of a project, names are translated to keys
+            # so issues stored without the name of their project match as well
+            matching = f'(project IN ({marks}) OR project IN (SELECT project FROM issues WHERE project_name IN ({marks})))'
+            return (matching if operator in ('=', 'in') else 'NOT ' + matching), values * 2
+        if operator in ('in', 'not in'):
+            return f'{column} {operator.upper()} ({marks})', values
+        return f'{column} {operator} ?', values
+
+    def search(self, clauses, order_by=(), limit=None, offset=0):
+        """
+        Returns stored issues matching all clauses.
+
+        Args:
+            clauses (list): Tuples (field, operator, values), all must match.
+            order_by (list): Tuples (field, descending), key descending if empty.
+            limit (int): Maximum number of issues to return, None for all.
+            offset (int): Number of matching issues to skip.
+        """
+        conditions, params = [], []
+        for clause in clauses:
+            condition, clause_params = self._condition(*clause)
+            conditions.append(condition)
+            params += clause_params
+        columns = lambda field: ['project', 'key_number'] if field in ('key', 'issuekey') else [self.TEXT_FIELDS.get(field) or self.DATE_FIELDS[field]]
+        order = [f'{column} {"DESC" if descending else "ASC"}' for field, descending in (order_by or [('key', True)]) for column in columns(field)]
+        sql = 'SELECT data FROM issues' + (' WHERE ' + ' AND '.join(conditions) if conditions else '') + ' ORDER BY ' + ', '.join(order)
+        sql += ' LIMIT ? OFFSET ?'
+        params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._loads(row[0]) for row in rows]
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Receives Jira webhook events (JSON in POST requests) and passes them to
+    the apply_event callback of the server. When the server has a secret set,
+    it must be given in the secret query parameter of the webhook URL.
+    Bodies larger than MAX_BODY_SIZE bytes are refused without being read.
+    """
+    MAX_BODY_SIZE = 10 * 1024 * 1024
+
+    def do_POST(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        if self.server.secret and not hmac.compare_digest(query.get('secret', [''])[0], self.server.secret):
+            self.send_error(403, 'Invalid secret')
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, 'Invalid Content-Length')
+            return
+        if length > self.MAX_BODY_SIZE:
+            self.send_error(413, 'Request body too large')
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            # also covers UnicodeDecodeError
+            self.send_error(400, 'Invalid JSON')
+            return
+        if not isinstance(payload, dict):
+            self.send_error(400, 'Not a webhook event')
+            return
+        self.server.apply_event(payload)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        self.server.log(format % args)
+
+
+class Metrics:
+    """
+    Registry of counters and latency histograms of one process, rendered in the
+    Prometheus text format. Safe to update from several threads.
+    """
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    HELP = {
+        'easyjira_api_requests_total': ('counter', 'HTTP requests sent to Jira by method and status code (error for failed connections)'),
+        'easyjira_api_request_duration_seconds': ('histogram', 'Latency of HTTP requests sent to Jira by method'),
+        'easyjira_api_retries_total': ('counter', 'Requests retried because of throttling or unavailability by status code'),
+        'easyjira_cache_lookups_total': ('counter', 'Cache lookups by cache (http, changelog, field_catalog, issue_store) and result (hit, revalidated, miss)'),
+        'easyjira_issues_read_total': ('counter', 'Issues read from search results'),
+        'easyjira_webhook_events_total': ('counter', 'Webhook events received by event and whether they were applied'),
+    }
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = collections.defaultdict(float)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _labels(self, labels):
+        # label values are text in the exposition format, e.g. status codes next to 'error'
+        return tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[(name, self._labels(labels))] += amount
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            histogram = self._histograms.setdefault((name, self._labels(labels)), {'buckets': [0] * len(self.LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def total(self, name, **labels):
+        """
+        Returns the sum of a counter over all label values matching the given labels.
+        """
+        with self._lock:
+            return sum(value for (counter, counter_labels), value in self._counters.items()
+                       if counter == name and all(item in counter_labels for item in self._labels(labels)))
+
+    def quantile(self, name, q):
+        """
+        Returns the upper bound of the histogram bucket (over all labels) containing the q quantile,
+        inf if it is above the largest bucket and None without observations.
+        """
+        with self._lock:
+            histograms = [histogram for (histogram_name, _), histogram in self._histograms.items() if histogram_name == name]
+            count = sum(histogram['count'] for histogram in histograms)
+            if not count:
+                return None
+            for index, bound in enumerate(self.LATENCY_BUCKETS):
+                if sum(histogram['buckets'][index] for histogram in histograms) >= q * count:
+                    return bound
+        return float('inf')
+
+    def _format_labels(self, labels):
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}' if labels else ''
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        format_value = lambda value: str(int(value)) if float(value).is_integer() else repr(value)
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        for name in sorted({name for (name, _), _ in counters} | {name for (name, _), _ in histograms}):
+            metric_type, help_text = self.HELP.get(name, ('untyped', name))
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+            lines += [f'{name}{self._format_labels(labels)} {format_value(value)}' for (counter, labels), value in counters if counter == name]
+            for (histogram_name, labels), histogram in histograms:
+                if histogram_name != name:
+                    continue
+                for bound, bucket_count in zip(self.LATENCY_BUCKETS, histogram['buckets']):
+                    lines.append(f'{name}_bucket{self._format_labels(labels + (("le", bound),))} {bucket_count}')
+                lines.append(f'{name}_bucket{self._format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'{name}_sum{self._format_labels(labels)} {format_value(histogram["sum"])}')
+                lines.append(f'{name}_count{self._format_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def progress_line(self):
+        """
+        Returns a one line summary of requests, latencies, retries and cache hits so far.
+        """
+        elapsed = max(time.time() - self.started, 1e-9)
+        requests_count = self.total('easyjira_api_requests_total')
+        http_lookups = self.total('easyjira_cache_lookups_total', cache='http')
+        http_hits = http_lookups - self.total('easyjira_cache_lookups_total', cache='http', result='miss')
+        latency = lambda q: 'n/a' if self.quantile('easyjira_api_request_duration_seconds', q) is None else f"<={self.quantile('easyjira_api_request_duration_seconds', q)}s"
+        return '{:.0f}s: {:.0f} requests ({:.1f}/s), latency p50 {} p95 {}, {:.0f} retries, {:.0f} errors, http cache hits {:.0f}/{:.0f}, {:.0f} issues read'.format(
+            elapsed, requests_count, requests_count / elapsed, latency(0.5), latency(0.95), self.total('easyjira_api_retries_total'),
+            self.total('easyjira_api_requests_total', status='error'), http_hits, http_lookups, self.total('easyjira_issues_read_total'))
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves metrics of the server's registry on /metrics.
+    """
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
 class EasyJira:
     def __init__(self):
         self.program_name = 'easyjira'
@@ -31,6 +579,9 @@ class EasyJira:
         self.JIRA_REST_URL = f"{self.JIRA_PROJECTS_URL}/rest/api/2"
         self.DEFAULT_MAX_RESULTS = 20
         self.STORY_POINTS_FIELD = 'customfield_12310243'
+        self.EPIC_LINK_FIELD = 'customfield_12311140'
+        # composite fields joining a list, grouping by them groups by each item of the list
+        self.LIST_GROUP_FIELDS = {'components_list': 'components', 'labels_list': 'labels'}
         # taken from fields-mapping output, can be extended
         self.AUTO_CUSTOM_FIELDS = {
              "customfield_12315948": "QA Contact",
@@ -56,13 +607,56 @@ class EasyJira:
              "customfield_12324748": "CVSS Score",
              "customfield_12324749": "CVE ID",
              }
+        # names of custom fields above as used in output formats (lowercase + underscore scheme)
+        self._auto_custom_field_slugs = {key: self._field_slug(name) for key, name in self.AUTO_CUSTOM_FIELDS.items()}
+        # fields added by _add_composite_fields
+        self.COMPOSITE_FIELDS = ['errata_description', 'errata_trackers', 'cves', 'labels_list', 'status_text', 'assignee_text',
+                                 'components_list', 'story_points', 'status_as_of_date'] + list(self._auto_custom_field_slugs.values())
+        self.FIELD_CATALOG_TTL = 24 * 3600
         self.stats_window = 1
+        # mapping of statuses to stages used by transition stats and cycle time analytics,
+        # can be replaced by --stages-file
+        self.STATUS_STAGES = {'In Progress': 'triaged', 'Planning': 'triaged', 'ASSIGNED': 'triaged', 'ON_DEV': 'triaged', 'MODIFIED': 'triaged', 'POST': 'triaged', 'Refinement': 'triaged', 'Planned': 'triaged', 'Blocked': 'triaged', 'New': 'triaged', 'In Development': 'triaged', 'Development': 'triaged',
+                              'Integration': 'built', 'ON_QA': 'built', 'Review': 'built',
+                              'Verified': 'tested', 'Release Pending': 'tested',
+                              'Closed': 'done', 'Abandoned': 'done', 'Done': 'done'}
+        self.STAGE_ORDER = ['triaged', 'built', 'tested', 'done']
+        # cycle time starts by entering this stage (or any later one) and ends by entering the last stage
+        self.CYCLE_START_STAGE = 'triaged'
+        self._unknown_statuses = set()
         self._token_path = os.path.expanduser("~/.config/jira/" + self.program_name)
+        self._token_env = 'JIRA_TOKEN'
+        self._cache_dir = os.path.expanduser("~/.cache/" + self.program_name)
+        self._profiles_path = os.path.expanduser("~/.config/jira/" + self.program_name + "-profiles.ini")
+        # state (connection pool, caches, token, limits) of every profile used by this process
+        self._profiles = {}
+        self._active_profile = None
+        self._parser = None
+        self._issue_stores = {}
+        self._field_catalogs = {}
+        self._metrics = Metrics()
+        self._webhook_lock = threading.Lock()
         self._token = None
         self._program_args = None
         self._default_output = "{key}"
         self._log_headers_done = False
         self._debug = False
+        self._json_backend = 'json'
+        self.DEFAULT_CONCURRENCY = 4
+        self._concurrency = self.DEFAULT_CONCURRENCY
+        self._session = None
+        self._rate_limiter = RateLimiter()
+        self._retries = 3
+        self._http_cache = HttpCache()
+        self._compress = None
+        # page size used when reading paginated per-issue resources like changelog
+        self.CHANGELOG_PAGE_SIZE = 100
+        # how many issues are sent in one /issue/bulk call or searched in one key in (...) query
+        self.BULK_SIZE = 50
+        # no matter how big maxResults is, Jira returns at most 1000 issues in one search call
+        self.SEARCH_PAGE_SIZE = 1000
+        self._regex_cache = {}
+        self._teams_cache = {}
 
         self.link_data = {
             "clones": {
@@ -109,18 +703,95 @@ class EasyJira:
             self._token = self._get_file_content(self._token_path).strip()
             return self._token
         except FileNotFoundError:
-            print(f'Configuration file {self._token_path} not found, one more attempt will be tried by reading JIRA_TOKEN environment variable, but storing it in a file with properly restrictive permissions might be safer.')
+            print(f'Configuration file {self._token_path} not found, one more attempt will be tried by reading {self._token_env} environment variable, but storing it in a file with properly restrictive permissions might be safer.')
 
         try:
-            self._token = os.environ['JIRA_TOKEN']
+            self._token = os.environ[self._token_env]
             return self._token
         except KeyError:
-            print("JIRA_TOKEN environment variable missing")
+            print(f"{self._token_env} environment variable missing")
 
-        self._error(f'All attempts to get a JIRA token failed. Create one in the Jira web interface (see your Profile section) and save only the token string into a file located at {self._token_path} with properly restricted access (preferred), or set it into the JIRA_TOKEN environment variable.')
+        self._error(f'All attempts to get a JIRA token failed. Create one in the Jira web interface (see your Profile section) and save only the token string into a file located at {self._token_path} with properly restricted access (preferred), or set it into the {self._token_env} environment variable.')
         return None
 
 
+    def _read_profile_settings(self, name):
+        """
+        Reads settings of a named profile from the profiles file, an INI file with one section per profile:
+
+            [staging]
+            url = https://issues.stage.redhat.com
+            token_file = ~/.config/jira/easyjira-staging
+            token_env = JIRA_STAGING_TOKEN
+            concurrency = 8
+            rate_limit = 5
+            cache_dir = ~/.cache/easyjira/staging
+
+        Returns:
+            dict: Settings of the profile, empty for the default profile (name None).
+        """
+        if not name:
+            return {}
+        config = configparser.ConfigParser()
+        if not config.read(self._profiles_path) or not config.has_section(name):
+            self._error(f'Profile {name} not found in {self._profiles_path}.')
+        return dict(config[name])
+
+
+    def _activate_profile(self, name, args):
+        """
+        Switches the server, token, connection pool, limits and caches to the given profile.
+        The state of every profile is created once and kept, so a process serving several
+        profiles reuses connections and caches of each of them without mixing them.
+        Limits and cache settings are applied again for every command, command line options
+        win over values of the profile.
+        """
+        if self._active_profile in self._profiles:
+            # keep what was created lazily while the previous profile was active
+            self._profiles[self._active_profile].update(token=self._token, session=self._session)
+        if name not in self._profiles:
+            settings = self._read_profile_settings(name)
+            url = settings.get('url', "https://issues.redhat.com").rstrip('/')
+            default_cache_dir = os.path.expanduser("~/.cache/" + self.program_name) + (f'/{name}' if name else '')
+            self._profiles[name] = {
+                'settings': settings,
+                'url': url,
+                'token_path': os.path.expanduser(settings.get('token_file', "~/.config/jira/" + self.program_name)),
+                'token_env': settings.get('token_env', 'JIRA_TOKEN'),
+                'token': None,
+                'session': None,
+                'cache_dir': os.path.expanduser(settings.get('cache_dir', default_cache_dir)),
+                'rate_limiter': None,
+                'http_cache': HttpCache(read_file=self._read_cache_file, write_file=self._write_cache_file),
+                'teams_cache': {},
+                'regex_cache': {},
+            }
+        profile = self._profiles[name]
+        settings = profile['settings']
+        rate = args.rate_limit if args.rate_limit is not None else float(settings.get('rate_limit', 0))
+        if not profile['rate_limiter'] or profile['rate_limiter'].rate != rate:
+            profile['rate_limiter'] = RateLimiter(rate)
+        http_cache = profile['http_cache']
+        http_cache.max_entries = args.http_cache_size
+        http_cache.ttl = args.http_cache_ttl
+        http_cache.directory = os.path.join(args.http_cache_dir, name) if args.http_cache_dir and name else args.http_cache_dir
+
+        self.JIRA_PROJECTS_URL = profile['url']
+        self.JIRA_REST_URL = f"{self.JIRA_PROJECTS_URL}/rest/api/2"
+        self._token_path = profile['token_path']
+        self._token_env = profile['token_env']
+        self._token = profile['token']
+        self._session = profile['session']
+        self._cache_dir = profile['cache_dir']
+        self._concurrency = args.concurrency if args.concurrency is not None else int(settings.get('concurrency', self.DEFAULT_CONCURRENCY))
+        self._rate_limiter = profile['rate_limiter']
+        self._http_cache = http_cache
+        self._teams_cache = profile['teams_cache']
+        self._regex_cache = profile['regex_cache']
+        self._active_profile = name
+        self._debug_print(f'Using profile {name or "default"}: {self.JIRA_PROJECTS_URL}')
+
+
     def _write_api_calls(self, data):
         """
         Writes API calls data to a file and/or prints it to stderr.
@@ -162,7 +833,12 @@ class EasyJira:
 
 
     def _get_headers(self) -> dict:
-        return self._get_auth_data()
+        headers = self._get_auth_data()
+        # ask for every compression the underlying urllib3 is able to decode (gzip, deflate,
+        # br and zstd if brotli and zstandard modules are installed), responses are
+        # decompressed as they are streamed
+        headers['Accept-Encoding'] = requests.utils.DEFAULT_ACCEPT_ENCODING
+        return headers
 
 
     def _log_arg(self, arg_name, arg):
@@ -183,6 +859,98 @@ class EasyJira:
         return f'{arg_name} = {enclosed_arg}'
 
 
+    def _get_session(self):
+        """
+        Returns a requests session shared by all API calls, so connections
+        are kept alive and reused, also by concurrent workers.
+        """
+        if not self._session:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(self._concurrency, 10))
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+        return self._session
+
+
+    def _run_concurrently(self, func, items):
+        """
+        Calls func for every item using a pool of threads limited by --concurrency.
+
+        Returns:
+            list: Results in the same order as items.
+        """
+        items = list(items)
+        if self._concurrency <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            return list(executor.map(func, items))
+
+
+    def _send_request(self, method, url, **kwargs):
+        """
+        Sends a request, GET requests of single issues are answered from the HTTP
+        cache when possible, changes of an issue drop its cached resources.
+        """
+        if method != 'get' or not self._http_cache.is_cacheable(url):
+            result = self._send_uncached_request(method, url, **kwargs)
+            if method != 'get':
+                self._http_cache.invalidate(url)
+            return result
+
+        cache_key = f"{url}?{kwargs['params']}" if kwargs.get('params') else url
+        entry = self._http_cache.get(cache_key)
+        if entry:
+            if self._http_cache.has_validators(entry):
+                kwargs['headers'] = dict(kwargs['headers'])
+                if 'ETag' in entry['headers']:
+                    kwargs['headers']['If-None-Match'] = entry['headers']['ETag']
+                if 'Last-Modified' in entry['headers']:
+                    kwargs['headers']['If-Modified-Since'] = entry['headers']['Last-Modified']
+            elif self._http_cache.is_fresh(entry):
+                self._debug_print(f'Response for {cache_key} served from cache')
+                self._metrics.inc('easyjira_cache_lookups_total', cache='http', result='hit')
+                return CachedResponse(entry)
+        result = self._send_uncached_request(method, url, **kwargs)
+        if result.status_code == 304 and entry:
+            self._debug_print(f'Cached response for {cache_key} revalidated')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='http', result='revalidated')
+            self._http_cache.refresh(cache_key, entry)
+            return CachedResponse(entry)
+        self._metrics.inc('easyjira_cache_lookups_total', cache='http', result='miss')
+        if result.status_code == 200:
+            self._http_cache.put(cache_key, result)
+        return result
+
+
+    def _send_uncached_request(self, method, url, **kwargs):
+        """
+        Sends a request respecting --rate-limit, requests rejected because of
+        throttling (429) are retried. Temporary unavailability (503) is retried only
+        for idempotent methods, a POST may have been processed before the 503 and
+        sending it again could e.g. create duplicate issues.
+        """
+        retried_statuses = (429, 503) if method.lower() in ('get', 'put', 'delete', 'head') else (429,)
+        for attempt in range(self._retries + 1):
+            self._rate_limiter.wait()
+            started = time.monotonic()
+            try:
+                result = self._get_session().request(method, url, **kwargs)
+            except requests.RequestException:
+                self._metrics.inc('easyjira_api_requests_total', method=method, status='error')
+                raise
+            self._metrics.observe('easyjira_api_request_duration_seconds', time.monotonic() - started, method=method)
+            self._metrics.inc('easyjira_api_requests_total', method=method, status=result.status_code)
+            self._debug_print('{} {}: {}, Content-Encoding: {}, Content-Length: {}'.format(method.upper(), url, result.status_code,
+                              result.headers.get('Content-Encoding', 'none'), result.headers.get('Content-Length', 'unknown')))
+            if result.status_code not in retried_statuses or attempt == self._retries:
+                return result
+            retry_after = result.headers.get('Retry-After', '')
+            delay = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+            self._metrics.inc('easyjira_api_retries_total', status=result.status_code)
+            self._debug_print(f'Request to {url} returned {result.status_code}, retrying in {delay}s')
+            time.sleep(delay)
+
+
     def _api_request(self, method, url, params=None, json=None, fake_return=None):
         headers = self._get_headers()
         log = ['']
@@ -190,19 +958,19 @@ class EasyJira:
             log.append(self._log_arg('json', json))
             log.append(f'response = requests.post("{url}", json=json, headers=headers)')
             if not self._program_args.simulate:
-                result = requests.post(url, json=json, headers=headers)
+                result = self._send_request('post', url, json=json, headers=headers)
             log.append(f'print(response.ok)')
         elif method == 'put':
             log.append(self._log_arg('json', json))
             log.append(f'response = requests.put("{url}", json=json, headers=headers)')
             if not self._program_args.simulate:
-                result = requests.put(url, json=json, headers=headers)
+                result = self._send_request('put', url, json=json, headers=headers)
             log.append(f'print(response.ok)')
         elif method == 'get':
             log.append(self._log_arg('params', params))
             log.append(f'response = requests.get("{url}", params=params, headers=headers)')
             if not self._program_args.simulate:
-                result = requests.get(url, params=params, headers=headers)
+                result = self._send_request('get', url, params=params, headers=headers)
             # not logging how to parse output, leaving this up to calling functions
         else:
             self._error(f'Error: Unsupported method for requests: {method}')
@@ -215,6 +983,64 @@ class EasyJira:
         return result
 
 
+    def _select_json_backend(self, name):
+        """
+        Picks the JSON backend used for decoding responses and encoding output.
+
+        Args:
+            name (str): One of auto, orjson, ujson or json; auto picks the fastest installed one.
+        """
+        available = {'orjson': orjson, 'ujson': ujson, 'json': json}
+        if name == 'auto':
+            name = 'orjson' if orjson else 'ujson' if ujson else 'json'
+        elif not available.get(name):
+            self._error(f'JSON backend {name} is not installed.')
+        self._json_backend = name
+        self._debug_print(f'Using JSON backend {name}')
+
+
+    def _json_loads(self, data):
+        """
+        Decodes JSON given as str or bytes using the selected backend.
+        """
+        if self._json_backend == 'orjson':
+            return orjson.loads(data)
+        if self._json_backend == 'ujson':
+            return ujson.loads(data)
+        return json.loads(data)
+
+
+    def _json_dumps(self, data, pretty=False):
+        """
+        Encodes data as JSON using the selected backend.
+
+        Compact output (pretty=False) is a single line usable for NDJSON. Pretty
+        output keeps the sorted keys and 4-space indentation, orjson only knows
+        2-space indentation, so stdlib is used for pretty output in that case.
+        """
+        if self._json_backend == 'orjson' and not pretty:
+            return orjson.dumps(data).decode('utf-8')
+        if self._json_backend == 'ujson':
+            if pretty:
+                return ujson.dumps(data, sort_keys=True, indent=4, escape_forward_slashes=False)
+            return ujson.dumps(data, escape_forward_slashes=False)
+        if pretty:
+            return json.dumps(data, sort_keys=True, indent=4)
+        return json.dumps(data, separators=(',', ':'))
+
+
+    def _response_json(self, r):
+        """
+        Decodes a response body directly from the received bytes.
+
+        This skips building r.text (charset detection and a decoded copy of
+        the whole body), which matters for multi-MB search pages.
+        """
+        if isinstance(r, FakeResponse):
+            return r.json()
+        return self._json_loads(r.content)
+
+
     def _report_api_failure(self, r):
         print(f'FAILURE: Api call failed.')
         print(f'Reason: {r.reason}')
@@ -223,10 +1049,22 @@ class EasyJira:
             pprint.pprint(r.raw)
 
 
+    def _get_tracker_info(self, issue):
+        """
+        Returns CVEs and flaw bugzillas (from labels), summary without CVE ids and stream suffix,
+        and the stream (e.g. rhel-9.2.0, None if not in the summary) of a security tracker.
+        """
+        labels = issue['fields']['labels']
+        cves = [l for l in labels if l.startswith(CVE_LABEL_PREFIX)]
+        bzs = [l[len(FLAW_BZ_LABEL_PREFIX):] for l in labels if l.startswith(FLAW_BZ_LABEL_PREFIX)]
+        summary = issue['fields']['summary']
+        summary_stripped = CVE_IN_TEXT_RE.sub('', STREAM_SUFFIX_RE.sub('', summary))
+        stream_match = STREAM_RE.search(summary)
+        return cves, bzs, summary_stripped, stream_match.group(1) if stream_match else None
+
+
     def _add_composite_fields(self, issue):
-        cves = [l for l in issue['fields']['labels'] if l.startswith('CVE-')]
-        bzs = [l.replace('flaw:bz#', '') for l in issue['fields']['labels'] if l.startswith('flaw:bz#')]
-        summary_stripped = re.sub(r'\s*CVE-[0-9]*-[0-9]*\s*', '', re.sub(r'\s*\[rhel.*\]\s*$', '', issue['fields']['summary']))
+        cves, bzs, summary_stripped, _ = self._get_tracker_info(issue)
         issue['fields']['errata_description'] = "{} ({})".format(summary_stripped, ' '.join(cves if len(cves) > 0 else bzs))
         issue['fields']['errata_trackers'] = ' '.join(cves + bzs)
         issue['fields']['cves'] = ' '.join(cves)
@@ -239,8 +1077,7 @@ class EasyJira:
             issue['fields']['story_points'] = issue['fields'][self.STORY_POINTS_FIELD]
 
         # add some popular custom fields by its name to fields directly, use lowercase + underscore scheme
-        for custom_field_key in self.AUTO_CUSTOM_FIELDS:
-            custom_field_name = self.AUTO_CUSTOM_FIELDS[custom_field_key].lower().replace(' ', '_').replace('/', '_')
+        for custom_field_key, custom_field_name in self._auto_custom_field_slugs.items():
             if custom_field_name not in issue['fields']:
                 if custom_field_key in issue['fields']:
                     if isinstance(issue['fields'][custom_field_key], dict) and 'name' in issue['fields'][custom_field_key]:
@@ -251,8 +1088,8 @@ class EasyJira:
                     issue['fields'][custom_field_name] = ''
 
         if self._debug:
-            pprint.pprint(issue['errata_trackers'])
-            pprint.pprint(issue['errata_description'])
+            pprint.pprint(issue['fields']['errata_trackers'])
+            pprint.pprint(issue['fields']['errata_description'])
         if hasattr(self._program_args, 'status_as_of_date') and self._program_args.status_as_of_date != 'now':
             issue['fields']['status_as_of_date'] = self._get_status_as_of_date(issue, self._program_args.status_as_of_date)
 
@@ -290,32 +1127,246 @@ class EasyJira:
             self._print_issue(output_format, issue, log_api_if_required=False)
 
 
+    def _print_json_array(self, items):
+        """
+        Prints items as a pretty JSON array one item at a time, so the whole
+        array does not need to be in memory. The output is the same as
+        json.dumps(list(items), sort_keys=True, indent=4).
+        """
+        self._print_rendered_json_array(self._render_json_item(item) for item in items)
+
+
+    def _render_json_item(self, item):
+        return textwrap.indent(self._json_dumps(item, pretty=True), '    ')
+
+
+    def _print_rendered_json_array(self, rendered_items):
+        """
+        Prints items already rendered by _render_json_item as a JSON array.
+        """
+        empty = True
+        for rendered in rendered_items:
+            print('[' if empty else ',')
+            print(rendered, end='')
+            empty = False
+        print('[]' if empty else '\n]')
+
+
     def _print_raw_issues(self, issues):
         self._write_api_calls("json.dumps(issues, sort_keys=True, indent=4))")
+        def with_composite_fields():
+            for issue in issues:
+                self._add_composite_fields(issue)
+                yield issue
+        self._print_json_array(with_composite_fields())
+
+
+    def _print_ndjson_issues(self, issues):
+        self._write_api_calls("for issue in issues:")
+        self._write_api_calls("    print(json.dumps(issue))")
         for issue in issues:
             self._add_composite_fields(issue)
-        print(json.dumps(issues, sort_keys=True, indent=4))
+            print(self._json_dumps(issue))
+
+
+    def _iter_transitions(self, issue):
+        """
+        Yields compact Transition records of status changes of an issue with changelog.
+        """
+        points = issue['fields'][self.STORY_POINTS_FIELD]
+        points = '0.0' if not points else points
+        for entry in issue['changelog']['histories']:
+            for item in entry['items']:
+                if item['field'] == 'status':
+                    yield Transition(issue['key'], item['fromString'], item['toString'], entry['created'], points)
 
 
     def _get_transitions_changelog(self, issues):
-        issues_transitions = []
-        for issue in issues:
-            for entry in issue['changelog']['histories']:
-                for item in entry['items']:
-                    if item['field'] == 'status':
-                        points = issue['fields'][self.STORY_POINTS_FIELD]
-                        points = '0.0' if not points else points
-                        issues_transitions.append({'key': issue['key'], 'from': item['fromString'], 'to': item['toString'], 'timestamp': entry['created'], 'points': points})
-        return issues_transitions
+        return [transition.as_dict() for issue in issues for transition in self._iter_transitions(issue)]
+
+
+    def _compress_bytes(self, data):
+        """
+        Compresses data according to --compress as one complete gzip member or zstd frame.
+        Concatenated members (frames) are a valid compressed file, so compressed data can be
+        appended to a file and the file can be cut at any boundary of appended data.
+        """
+        if self._compress == 'gzip':
+            return gzip.compress(data)
+        if self._compress == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)
+        return data
+
+
+    def _open_for_reading(self, path):
+        """
+        Opens a file written by easyjira as a binary stream, gzip and zstd
+        compressed files are recognized and decompressed transparently.
+        """
+        with open(path, 'rb') as f:
+            magic = f.read(4)
+        if magic.startswith(GZIP_MAGIC):
+            return gzip.open(path, 'rb')
+        if magic == ZSTD_MAGIC:
+            if not zstandard:
+                self._error(f'File {path} is compressed by zstd, but python zstandard module is not installed.')
+            # closefd makes closing the reader close the file as well
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True))
+        return open(path, 'rb')
+
+
+    def _read_cache_file(self, path):
+        """
+        Returns data stored by _write_cache_file or None if there is no usable cache.
+        """
+        try:
+            with self._open_for_reading(path) as f:
+                return self._json_loads(f.read())
+        except (OSError, ValueError, EOFError):
+            return None
+
+
+    def _write_cache_file(self, path, data):
+        """
+        Stores data as JSON (compressed according to --compress), the file is replaced
+        atomically so concurrent readers never see a partially written cache.
+        """
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._compress_bytes(self._json_dumps(data).encode('utf-8')))
+        os.replace(tmp_path, path)
+
+
+    def _get_status_changelog(self, issue_key, updated=None):
+        """
+        Retrieves only status changes of an issue using the paginated changelog endpoint.
+
+        Results are cached per issue and reused as long as the issue's
+        'updated' timestamp did not change.
+
+        Args:
+            issue_key (str): The key of the issue.
+            updated (str): The 'updated' field of the issue, used to validate the cache.
+
+        Returns:
+            list: Changelog histories (dicts with 'created' and 'items') that include status changes only.
+        """
+        cache_path = os.path.join(self._cache_dir, 'changelog', f'{issue_key}.json')
+        cached = self._read_cache_file(cache_path) if updated else None
+        if cached and cached.get('updated') == updated:
+            self._debug_print(f'Changelog of {issue_key} read from cache')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='changelog', result='hit')
+            return cached['histories']
+        self._metrics.inc('easyjira_cache_lookups_total', cache='changelog', result='miss')
+
+        histories = []
+        start_at = 0
+        while True:
+            query = urllib.parse.urlencode([('startAt', start_at), ('maxResults', self.CHANGELOG_PAGE_SIZE)])
+            r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{issue_key}/changelog", params=query)
+            if not r.ok:
+                self._report_api_failure(r)
+                self._error(f'Could not read changelog for issue {issue_key}.')
+            data = self._response_json(r)
+            for entry in data['values']:
+                items = [item for item in entry['items'] if item['field'] == 'status']
+                if items:
+                    histories.append({'created': entry['created'], 'items': items})
+            start_at += len(data['values'])
+            if data.get('isLast', True) or not data['values'] or start_at >= data.get('total', 0):
+                break
+
+        if updated:
+            self._write_cache_file(cache_path, {'updated': updated, 'histories': histories})
+        return histories
+
+
+    def _attach_status_changelogs(self, issues):
+        """
+        Fills issue['changelog'] with status history fetched concurrently by _get_status_changelog,
+        so the result can be used the same way as issues searched with expand=changelog.
+        """
+        self._write_api_calls("# status history of each issue is read from {JIRA_REST_URL}/issue/<key>/changelog")
+        histories = self._run_concurrently(lambda issue: self._get_status_changelog(issue['key'], issue['fields'].get('updated')), issues)
+        for issue, issue_histories in zip(issues, histories):
+            issue['changelog'] = {'histories': issue_histories}
 
 
     def _print_transitions_changelog(self, issues):
-        print(json.dumps(self._get_transitions_changelog(issues), sort_keys=True, indent=4))
+        self._print_json_array(transition.as_dict() for issue in issues for transition in self._iter_transitions(issue))
+
+
+    def _process_page(self, mode, output_format, page):
+        """
+        Does the CPU bound part of printing a page of issues, used by worker processes of --workers.
+
+        Args:
+            mode (str): format (lines rendered by output_format), ndjson (NDJSON lines), raw (JSON array
+                items), transitions (JSON array items of transitions) or compact (issues reduced to fields
+                and status changes needed by transition stats).
+            output_format (str): Format used by the format mode.
+            page (list): Issues.
+
+        Returns:
+            str for format and ndjson modes, list otherwise.
+        """
+        if mode == 'transitions':
+            return [self._render_json_item(transition.as_dict()) for issue in page for transition in self._iter_transitions(issue)]
+        if mode == 'compact':
+            fields = (self.STORY_POINTS_FIELD, 'created')
+            return [{'key': issue['key'], 'fields': {field: issue['fields'][field] for field in fields},
+                     'changelog': {'histories': [{'created': entry['created'], 'items': [item for item in entry['items'] if item['field'] == 'status']}
+                                                 for entry in issue['changelog']['histories']]}}
+                    for issue in page]
+        for issue in page:
+            self._add_composite_fields(issue)
+        if mode == 'format':
+            return ''.join(output_format.format(**issue) + '\n' for issue in page)
+        if mode == 'ndjson':
+            return ''.join(self._json_dumps(issue) + '\n' for issue in page)
+        return [self._render_json_item(issue) for issue in page]
+
+
+    def _iter_processed_pages(self, mode, output_format, pages, workers):
+        """
+        Processes pages by _process_page in worker processes and yields the results in the order
+        of pages. Only a few pages per worker are in flight, so pages are still streamed.
+        """
+        settings = {'story_points_field': self.STORY_POINTS_FIELD, 'auto_custom_fields': self.AUTO_CUSTOM_FIELDS,
+                    'status_as_of_date': getattr(self._program_args, 'status_as_of_date', 'now'), 'json_backend': self._json_backend}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(settings,)) as executor:
+            pending = collections.deque()
+            for page in pages:
+                pending.append(executor.submit(_process_page, mode, output_format, page))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+    def _print_pages_in_processes(self, pages, args, output_format):
+        """
+        Prints pages of issues like cmd_query does, with composite fields, rendering and
+        transition extraction split across args.workers processes.
+        """
+        self._debug_print(f'Processing pages in {args.workers} processes')
+        if args.raw:
+            self._write_api_calls("json.dumps(issues, sort_keys=True, indent=4))")
+            self._print_rendered_json_array(item for items in self._iter_processed_pages('raw', None, pages, args.workers) for item in items)
+        elif args.transitions_changelog:
+            self._print_rendered_json_array(item for items in self._iter_processed_pages('transitions', None, pages, args.workers) for item in items)
+        elif args.transitions_stats:
+            self._print_transitions_stats(issue for issues in self._iter_processed_pages('compact', None, pages, args.workers) for issue in issues)
+        else:
+            self._write_api_calls("for issue in issues:")
+            self._write_api_calls("    print(json.dumps(issue))" if args.ndjson else "    print('{key}'.format(**issue))")
+            for text in self._iter_processed_pages('ndjson' if args.ndjson else 'format', output_format, pages, args.workers):
+                sys.stdout.write(text)
 
 
     def _get_bucket_key(self, timestamp):
-        parsed_date = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z")
-        return parsed_date.strftime("%Y%W")
+        return self._parse_timestamp(timestamp).strftime("%Y%W")
 
 
     def _standardize_points(self, points):
@@ -323,53 +1374,168 @@ class EasyJira:
         return 3 if points < 0.5 else points
 
 
-    def _store_bucket(self, bucket, bucket_key, item_key, item_value):
-        if bucket_key not in bucket:
-            bucket[bucket_key] = {}
-        bucket[bucket_key][item_key] = item_value
+    def _add_to_stats(self, stage_stats, bucket_key, points):
+        for i in range(self.stats_window):
+            k = str(int(bucket_key)-i)
+            stage_stats[k] = stage_stats.get(k, 0) + points
 
 
     def _print_transitions_stats(self, issues):
-        buckets = {'created': {}, 'triaged': {}, 'built': {}, 'tested': {}, 'done': {}}
-        stats = {'created': {}, 'triaged': {}, 'built': {}, 'tested': {}, 'done': {}}
-        tmp_buckets = {'triaged': {}, 'built': {}, 'tested': {}, 'done': {}}
+        """
+        Prints story points of issues created and entering every stage per week.
 
-        self._debug_print("number of issues: {}".format(str(len(issues))))
+        Issues are processed in one pass and reduced to compact transition records,
+        only the week and points of the first entry into every stage (the last one
+        for the final stage) are kept for every issue.
+        """
+        final_stage = self.STAGE_ORDER[-1]
+        stats = {stage: {} for stage in ['created'] + self.STAGE_ORDER}
+        entered = {stage: {} for stage in self.STAGE_ORDER}
+        issues_count = 0
 
         for issue in issues:
-            self._store_bucket(buckets['created'], self._get_bucket_key(issue['fields']['created']), issue['key'], self._standardize_points(issue['fields'][self.STORY_POINTS_FIELD]))
-
-        transitions = self._get_transitions_changelog(issues)
-        buckets_definition = {'In Progress': 'triaged', 'Planning': 'triaged', 'ASSIGNED': 'triaged', 'ON_DEV': 'triaged', 'MODIFIED': 'triaged', 'POST': 'triaged', 'Refinement': 'triaged', 'Planned': 'triaged', 'Blocked': 'triaged', 'New': 'triaged', 'In Development': 'triaged', 'Development': 'triaged',
-                              'Integration': 'built', 'ON_QA': 'built', 'Review': 'built',
-                              'Verified': 'tested', 'Release Pending': 'tested',
-                              'Closed': 'done', 'Abandoned': 'done', 'Done': 'done'}
-        for transition in transitions:
-            self._store_bucket(tmp_buckets[buckets_definition[transition['to']]], transition['key'], self._get_bucket_key(transition['timestamp']), self._standardize_points(transition['points']))
-
-        for bucket_key in tmp_buckets:
-            for issue_key in tmp_buckets[bucket_key]:
-                best_key = max(tmp_buckets[bucket_key][issue_key].keys()) if bucket_key == 'done' else min(tmp_buckets[bucket_key][issue_key].keys())
-                self._store_bucket(buckets[bucket_key], best_key, issue_key, tmp_buckets[bucket_key][issue_key][best_key])
-
-        for bucket_key in buckets:
-            for date_key in buckets[bucket_key]:
-                for i in range(self.stats_window):
-                    k = str(int(date_key)-i)
-                    if k not in stats[bucket_key]:
-                        stats[bucket_key][k] = 0
-                    stats[bucket_key][k] += sum(buckets[bucket_key][date_key].values())
-
-        stats_date = {}
-        for bucket_key in stats:
-            for date_key in stats[bucket_key]:
-                if date_key not in stats_date:
-                    stats_date[date_key] = {}
-                stats_date[date_key][bucket_key] = stats[bucket_key][date_key]
+            issues_count += 1
+            self._add_to_stats(stats['created'], self._get_bucket_key(issue['fields']['created']), self._standardize_points(issue['fields'][self.STORY_POINTS_FIELD]))
+            for transition in self._iter_transitions(issue):
+                stage = self._get_stage(transition.to_status)
+                if stage not in entered:
+                    continue
+                bucket_key = self._get_bucket_key(transition.timestamp)
+                best = entered[stage].get(transition.key)
+                if best is None or (bucket_key >= best[0] if stage == final_stage else bucket_key <= best[0]):
+                    entered[stage][transition.key] = (bucket_key, self._standardize_points(transition.points))
+
+        self._debug_print("number of issues: {}".format(str(issues_count)))
+
+        for stage in entered:
+            for bucket_key, points in entered[stage].values():
+                self._add_to_stats(stats[stage], bucket_key, points)
 
         print('\t'.join(['week'] + list(stats.keys())))
-        for date_key in sorted(stats_date.keys()):
-            print('\t'.join([date_key] + [(str(stats_date[date_key][bucket_key]) if bucket_key in stats_date[date_key] else '0') for bucket_key in stats]))
+        for date_key in sorted({date_key for stage_stats in stats.values() for date_key in stage_stats}):
+            print('\t'.join([date_key] + [str(stats[stage].get(date_key, 0)) for stage in stats]))
+
+
+    def _get_stage(self, status):
+        """
+        Returns the stage of a status, statuses that are not mapped are reported once and return None.
+        """
+        stage = self.STATUS_STAGES.get(status)
+        if stage is None and status not in self._unknown_statuses:
+            self._unknown_statuses.add(status)
+            self._warning(f"Status '{status}' is not mapped to any stage, it is ignored in stats. Use --stages-file to map it.")
+        return stage
+
+
+    def _load_stages_file(self, filename):
+        """
+        Loads the status to stage mapping from a JSON file. The file is either a plain
+        mapping {"In Progress": "triaged", ...} or a dict with keys "statuses" (the mapping),
+        and optionally "stage_order" (list of stages) and "cycle_start" (stage).
+        """
+        with open(filename, 'rb') as f:
+            data = self._json_loads(f.read())
+        self.STATUS_STAGES = data['statuses'] if isinstance(data.get('statuses'), dict) else data
+        stage_order = data.get('stage_order')
+        if not stage_order:
+            stage_order = []
+            for stage in self.STATUS_STAGES.values():
+                if stage not in stage_order:
+                    stage_order.append(stage)
+        self.STAGE_ORDER = stage_order
+        self.CYCLE_START_STAGE = data.get('cycle_start', self.STAGE_ORDER[0])
+
+
+    def _parse_timestamp(self, timestamp):
+        try:
+            return datetime.datetime.fromisoformat(timestamp)
+        except ValueError:
+            return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+    def _get_issue_timing(self, issue, now=None):
+        """
+        Computes time spent in every status, cycle time and lead time of an issue
+        in a single sweep over its status transitions sorted by time.
+
+        Cycle time runs from the first transition into the cycle start stage (or any later one,
+        creation if there is no such transition) to the last transition into the final stage,
+        lead time from creation to the same point.
+        Both are None for issues that are not in the final stage.
+
+        Returns:
+            dict: key, time_in_status (status to days), cycle_time and lead_time (days).
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        created = self._parse_timestamp(issue['fields']['created'])
+        transitions = sorted((entry['created'], item['fromString'], item['toString'])
+                             for entry in issue['changelog']['histories'] for item in entry['items'] if item['field'] == 'status')
+        start_index = self.STAGE_ORDER.index(self.CYCLE_START_STAGE) if self.CYCLE_START_STAGE in self.STAGE_ORDER else 0
+        final_stage = self.STAGE_ORDER[-1]
+
+        time_in_status = {}
+        status = transitions[0][1] if transitions else issue['fields']['status']['name']
+        since = created
+        cycle_start = None
+        done_at = None
+        for timestamp, from_status, to_status in transitions:
+            moment = self._parse_timestamp(timestamp)
+            time_in_status[status] = time_in_status.get(status, 0) + (moment - since).total_seconds()
+            status, since = to_status, moment
+            stage = self.STATUS_STAGES.get(status)
+            if stage in self.STAGE_ORDER and cycle_start is None and self.STAGE_ORDER.index(stage) >= start_index:
+                cycle_start = moment
+            done_at = moment if stage == final_stage else None
+        # time in the final status of done issues is not counted
+        if not done_at:
+            time_in_status[status] = time_in_status.get(status, 0) + (now - since).total_seconds()
+
+        day = 86400.0
+        return {'key': issue['key'],
+                'time_in_status': {s: round(seconds / day, 2) for s, seconds in time_in_status.items()},
+                'cycle_time': round((done_at - (cycle_start or created)).total_seconds() / day, 2) if done_at else None,
+                'lead_time': round((done_at - created).total_seconds() / day, 2) if done_at else None}
+
+
+    def _percentile(self, sorted_values, percent):
+        """
+        Returns the nearest-rank percentile of already sorted values.
+        """
+        if not sorted_values:
+            return None
+        index = max(0, int(-(-percent * len(sorted_values) // 100)) - 1)
+        return sorted_values[index]
+
+
+    def _print_cycle_time(self, pages, group_by, time_in_status=False):
+        """
+        Prints cycle time and lead time percentiles per group, or timing of every issue
+        as NDJSON with time_in_status=True. Pages are processed one by one and only the
+        computed times are kept, so this scales to large numbers of issues.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        groups = {}
+        for page in pages:
+            for issue in page:
+                timing = self._get_issue_timing(issue, now)
+                if time_in_status:
+                    print(self._json_dumps(timing))
+                    continue
+                self._add_composite_fields(issue)
+                for group_key in self._group_keys(issue, group_by):
+                    group = groups.setdefault(group_key, ([], []))
+                    if timing['cycle_time'] is not None:
+                        group[0].append(timing['cycle_time'])
+                        group[1].append(timing['lead_time'])
+        if time_in_status:
+            return
+
+        percents = [50, 85, 95]
+        print('\t'.join(group_by + ['done'] + [f'cycle_p{p}' for p in percents] + [f'lead_p{p}' for p in percents]))
+        for group_key in sorted(groups):
+            cycle_times, lead_times = sorted(groups[group_key][0]), sorted(groups[group_key][1])
+            values = [self._percentile(cycle_times, p) for p in percents] + [self._percentile(lead_times, p) for p in percents]
+            print('\t'.join(list(group_key) + [str(len(cycle_times))] + ['' if v is None else str(v) for v in values]))
 
 
     def _get_file_content(self, filename):
@@ -384,7 +1550,7 @@ class EasyJira:
         query = urllib.parse.urlencode(param_list)
         r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{issue}", params=query)
         self._write_api_calls("issues = [response.json()]")
-        return r.json()
+        return self._response_json(r)
 
 
     def _get_issue_types(self, project):
@@ -402,7 +1568,7 @@ class EasyJira:
             dict: A dictionary mapping issue type names to their IDs.
         """
         r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/createmeta/{project}/issuetypes")
-        data = r.json()
+        data = self._response_json(r)
         result = {}
         try:
             result = {t['name']:t['id'] for t in data['values']}
@@ -412,147 +1578,1209 @@ class EasyJira:
         return result
 
 
-    def _get_fields_mapping(self, project, issue_type, only_required=False):
+    def _get_fields_mapping(self, project, issue_type, only_required=False):
+        """
+        Retrieves the field mapping for a specific issue type in a project.
+
+        Makes a GET request to the Jira API to fetch the field mapping
+        for the given issue type in the specified project. Returns a
+        dictionary mapping field IDs to their corresponding names.
+
+        Args:
+            project (str): The key or ID of the project.
+            issue_type (str): The name of the issue type.
+            only_required (bool): Flag to include only required fields in the mapping.
+
+        Returns:
+            dict: A dictionary mapping field IDs to their names.
+        """
+        issue_types = self._get_issue_types(project)
+        mapping = {}
+        # TODO: createmeta only shows some subset of fields, we should rather use editmeta,
+        # but we need some ticket for that -- that can be done by querying any issue of the
+        # specific type and ask about that particular issue
+        # {self.JIRA_REST_URL}/issue/{issue}/editemeta?expand=projects.issuetypes.fields
+        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/createmeta/{project}/issuetypes/{issue_types[issue_type]}")
+        data = self._response_json(r)
+        try:
+            mapping = { field['fieldId']:field['name'] for field in data['values'] if field['required'] or not only_required }
+        except (KeyError, IndexError):
+            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
+            self._error(f'Data not found. It is possible that project {project} has no issue type {issue_type}. Reason given by Jira: {reason}')
+        return mapping
+
+
+    def _get_teams_for_issue(self, jira_id):
+        """
+        Retrieves the teams list for a specific issue (usable in RHEL* projects)
+        """
+        teams = {}
+        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{jira_id}/editmeta?fields=customfield_12326540")
+        data = self._response_json(r)
+        try:
+            teams = { team['value']:team['id'] for team in data['fields']['customfield_12326540']['allowedValues'] }
+        except (KeyError, IndexError):
+            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
+            self._error(f'Data not found. It is possible that project {project} has no field customfield_12326540. Reason given by Jira: {reason}')
+        return teams
+
+
+    def _get_fields_mapping_for_issue(self, jira_id, only_required=False):
+        """
+        Retrieves the field mapping for a specific issue type in a project.
+
+        Works similarly to _get_fields_mapping, except the project and issue
+        type is specified by a concrete issue.
+
+        See _get_fields_mapping for more information.
+        """
+        mapping = {}
+        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{jira_id}/editmeta?expand=projects.issuetypes.fields")
+        data = self._response_json(r)
+        try:
+            mapping = { key:data['fields'][key]['name'] for key in data['fields'] if data['fields'][key]['required'] or not only_required }
+        except (KeyError, IndexError):
+            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
+            self._error(f'Data not found. It is possible that project {project} has no issue type {issue_type}. Reason given by Jira: {reason}')
+        return mapping
+
+
+    def _get_jql_from_url(self, url) -> str:
+        """
+        Extracts the JQL (Jira Query Language) from a given URL.
+        """
+        url_parsed = urllib.parse.urlparse(url)
+        jql = ''
+        if url_parsed.query != '':
+            for url_query in urllib.parse.parse_qsl(url_parsed.query):
+                if url_query[0] == 'filter' and len(url_query) == 2:
+                    jql = 'filter={}'.format(url_query[1])
+                elif url_query[0] == 'jql' and len(url_query) == 2:
+                    # not sure how we can only encode the value
+                    jql = url_query[1]
+        self._debug_print("JQL parsed from URL: '{}'".format(jql))
+        return jql
+
+
+    def _field_slug(self, name):
+        return name.lower().replace(' ', '_').replace('/', '_')
+
+
+    def _get_field_catalog(self):
+        """
+        Returns a mapping of field ids, lowercase names and slugs (lowercase + underscore scheme)
+        of all fields known to the server to field ids. The list of fields is read from the /field
+        endpoint and cached on disk for FIELD_CATALOG_TTL seconds, the mapping is built once per process.
+        """
+        cache_path = os.path.join(self._cache_dir, 'fields.json')
+        if cache_path in self._field_catalogs:
+            return self._field_catalogs[cache_path]
+        cached = self._read_cache_file(cache_path)
+        if cached and time.time() - cached['stored'] < self.FIELD_CATALOG_TTL:
+            fields = cached['fields']
+            self._debug_print('Field catalog read from cache')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='field_catalog', result='hit')
+        else:
+            self._metrics.inc('easyjira_cache_lookups_total', cache='field_catalog', result='miss')
+            r = self._api_request('get', f"{self.JIRA_REST_URL}/field")
+            if not r.ok:
+                self._report_api_failure(r)
+                self._error('Could not read the list of fields.')
+            fields = [{'id': field['id'], 'name': field['name'], 'custom': field.get('custom', field['id'].startswith('customfield_'))} for field in self._response_json(r)]
+            self._write_cache_file(cache_path, {'stored': time.time(), 'fields': fields})
+        catalog = {}
+        # system fields (custom: false in /field) win over custom fields of the same name, otherwise the first field wins
+        for field in sorted(fields, key=lambda field: field.get('custom', field['id'].startswith('customfield_'))):
+            catalog.setdefault(field['id'], field['id'])
+            catalog.setdefault(field['name'].lower(), field['id'])
+            catalog.setdefault(self._field_slug(field['name']), field['id'])
+        self._field_catalogs[cache_path] = catalog
+        return catalog
+
+
+    def _resolve_field_name(self, name):
+        """
+        Returns the id of a field given by id, name or slug (e.g. Story Points or story_points),
+        the field catalog is read only for names that are not AUTO_CUSTOM_FIELDS or custom field ids,
+        system fields are resolved by the catalog like any other field.
+        Returns None for unknown names.
+        """
+        if name.startswith('customfield_'):
+            return name
+        for key, slug in self._auto_custom_field_slugs.items():
+            if name == slug or name.lower() == self.AUTO_CUSTOM_FIELDS[key].lower():
+                return key
+        catalog = self._get_field_catalog()
+        return catalog.get(name) or catalog.get(name.lower()) or catalog.get(self._field_slug(name))
+
+
+    def _resolve_output_format(self, output_format):
+        """
+        Rewrites {fields[Field Name]} and {fields[field_name]} references in an output format to
+        field ids, so any field can be referenced by its name without a per-issue lookup.
+        References to ids, fields added by _add_composite_fields and unknown names are kept.
+        """
+        result = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(output_format):
+            result.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field_name is None:
+                continue
+            match = re.match(r'fields\[([^\]]+)\]', field_name)
+            if match and match.group(1) not in self.COMPOSITE_FIELDS:
+                field_id = self._resolve_field_name(match.group(1))
+                if field_id:
+                    field_name = f'fields[{field_id}]' + field_name[match.end():]
+            result.append('{' + field_name + (f'!{conversion}' if conversion else '') + (f':{format_spec}' if format_spec else '') + '}')
+        return ''.join(result)
+
+
+    def _resolve_field_names(self, names):
+        """
+        Returns ids of fields given by ids, names or slugs, unknown names are an error.
+        """
+        ids = []
+        for name in filter(None, (name.strip() for name in names)):
+            field_id = self._resolve_field_name(name)
+            if not field_id:
+                self._error(f'Field {name} not found, see fields-mapping --catalog for known fields')
+            ids.append(field_id)
+        return ids
+
+
+    def cmd_fields_mapping(self, args):
+        """
+        Command handler for retrieving and printing field mappings.
+        """
+        if args.catalog:
+            catalog = self._get_field_catalog()
+            mapping = {key: field_id for key, field_id in catalog.items() if key != field_id}
+        elif args.id:
+            mapping = self._get_fields_mapping_for_issue(args.id, args.only_required)
+        else:
+            mapping = self._get_fields_mapping(args.project, args.issue_type, args.only_required)
+        print(self._json_dumps(mapping, pretty=True))
+
+
+    def _split_order_by(self, jql):
+        """
+        Splits JQL into the condition and the ORDER BY clause, so the condition
+        can be combined with other conditions.
+
+        Returns:
+            tuple: (condition, order by clause or empty string)
+        """
+        match = re.search(r'\s*\border\s+by\b.*$', jql, re.IGNORECASE | re.DOTALL)
+        if not match:
+            return jql.strip(), ''
+        return jql[:match.start()].strip(), match.group(0).strip()
+
+
+    def _iter_search_pages(self, jql, max_results=None, start_at=0, expand=None, fields=None):
+        """
+        Yields pages (lists of issues) of a JQL search, repeating the search
+        call as needed, as Jira returns at most 1000 issues in one call.
+
+        Args:
+            jql (str): JQL query string.
+            max_results (int): Maximum number of issues to retrieve, None for all.
+            start_at (int): Index of the first result to retrieve.
+            expand (str): Value passed as expand parameter.
+            fields (list): Fields to return, all navigable fields if not set.
+        """
+        fetched = 0
+        while max_results is None or fetched < max_results:
+            page_size = self.SEARCH_PAGE_SIZE if max_results is None else max_results - fetched
+            param_list = [('jql', jql), ('maxResults', page_size), ('startAt', start_at)]
+            if expand:
+                param_list.append(('expand', expand))
+            if fields:
+                param_list.append(('fields', ','.join(fields)))
+            query = urllib.parse.urlencode(param_list)
+            r = self._api_request('get', f"{self.JIRA_REST_URL}/search", params=query)
+            self._write_api_calls("issues = response.json()['issues']")
+            if not r.ok:
+                self._report_api_failure(r)
+                self._error(f'Searching issues failed for JQL: {jql}')
+            data = self._response_json(r)
+            issues = data['issues']
+            self._metrics.inc('easyjira_issues_read_total', len(issues))
+            if issues:
+                yield issues
+            fetched += len(issues)
+            start_at += len(issues)
+            if not issues or start_at >= data.get('total', 0):
+                break
+
+
+    def _get_issues(self, ids=None, from_url=None, jql=None, max_results=None, start_at=0, expand=None, auto_paginate=None, fields=None):
+        """
+        Retrieves issues based on issue IDs, a URL with a query, or
+        a JQL query. Returns a list of issues.
+
+        Args:
+            ids (list): List of issue IDs.
+            from_url (str): URL containing a query.
+            jql (str): JQL query string.
+            max_results (int): Maximum number of results to retrieve.
+            start_at (int): Index of the first result to retrieve.
+            auto_paginate (bool): Retrieve all results, ignoring max_results.
+            fields (list): Fields to return for JQL results, all navigable fields if not set.
+
+        Returns:
+            list: A list of issues.
+        """
+        output=[]
+
+        # get issues based on ID
+        if ids:
+            for issue in ids:
+                output.append(self._get_issue(issue, expand))
+
+        # get issues based on url with a query
+        if from_url:
+            jql = self._get_jql_from_url(from_url)
+
+        # get issues based on jql only
+        if jql:
+            for page in self._iter_search_pages(jql, None if auto_paginate else max_results, start_at, expand, fields):
+                output += page
+
+        return output
+
+
+    def _and_jql(self, condition, extra):
+        """
+        Returns JQL that requires both the condition (may be empty) and the extra condition.
+        """
+        return f'({condition}) AND {extra}' if condition else extra
+
+
+    def _jql_date(self, timestamp, delta=datetime.timedelta(0)):
+        """
+        Converts a Jira timestamp (e.g. 2023-02-02T10:00:00.000+0000) into the JQL date format, in UTC.
+        """
+        parsed_date = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z")
+        return (parsed_date.astimezone(datetime.timezone.utc) + delta).strftime("%Y/%m/%d %H:%M")
+
+
+    def _watch_query(self, name, jql, expand=None):
+        """
+        Compares the current result of a JQL query with the snapshot stored
+        under a name by the previous run and stores a new snapshot.
+
+        Only issues updated since the previous run are fetched in full, removed
+        issues are found by a cheap pass that reads keys only.
+
+        Returns:
+            list: Events, dicts with event (added, changed or removed), key, updated and issue (not for removed).
+        """
+        snapshot_path = os.path.join(self._cache_dir, 'snapshots', f'{name}.json')
+        snapshot = self._read_cache_file(snapshot_path)
+        condition, order_by = self._split_order_by(jql)
+        events = []
+        if not snapshot or snapshot.get('jql') != jql:
+            self._debug_print(f'No usable snapshot for {name}, reading all issues')
+            old = {}
+            recent = {issue['key']: issue for page in self._iter_search_pages(jql, expand=expand) for issue in page}
+            current_keys = set(recent)
+        else:
+            old = snapshot['issues']
+            # JQL dates are interpreted in the user's time zone, one day margin covers any offset,
+            # issues that were not really changed are filtered out by comparing 'updated' below
+            timestamps = [updated for updated in old.values() if updated]
+            recent = {}
+            if old:
+                # without any known timestamp, all issues are read again
+                delta_jql = self._and_jql(condition, f'updated >= "{self._jql_date(max(timestamps), -datetime.timedelta(days=1))}"') if timestamps else condition
+                recent = {issue['key']: issue for page in self._iter_search_pages(delta_jql, expand=expand) for issue in page}
+            current_keys = {issue['key'] for page in self._iter_search_pages(condition, fields=['key']) for issue in page}
+            current_keys |= set(recent)
+            # issues that newly match the query without being updated recently
+            missing = current_keys - set(old) - set(recent)
+            if missing:
+                recent.update({issue['key']: issue for issue in self._search_issues_by_keys(sorted(missing), expand=expand)})
+
+        issues = {key: updated for key, updated in old.items() if key in current_keys}
+        for key in sorted(recent):
+            issue = recent[key]
+            updated = issue['fields'].get('updated')
+            if key not in old:
+                events.append({'event': 'added', 'key': key, 'updated': updated, 'issue': issue})
+            elif old[key] != updated:
+                events.append({'event': 'changed', 'key': key, 'updated': updated, 'issue': issue})
+            issues[key] = updated
+        for key in sorted(set(old) - current_keys):
+            events.append({'event': 'removed', 'key': key, 'updated': old[key]})
+
+        self._write_cache_file(snapshot_path, {'jql': jql, 'issues': issues})
+        return events
+
+
+    def _print_watch_events(self, events):
+        for event in events:
+            if 'issue' in event:
+                self._add_composite_fields(event['issue'])
+            print(self._json_dumps(event))
+        sys.stdout.flush()
+
+
+    def _parse_aggregations(self, spec):
+        """
+        Parses aggregations like 'count,sum(story_points),avg(story_points)'.
+
+        Returns:
+            list: Tuples (function, field name), field name is None for count.
+        """
+        aggregations = []
+        for item in filter(None, [i.strip() for i in spec.split(',')]):
+            match = re.fullmatch(r'(count|sum|avg|min|max)(?:\((\w+)\))?', item)
+            if not match or (match.group(1) != 'count' and not match.group(2)):
+                self._error(f"Aggregation '{item}' not recognized, use count, sum(field), avg(field), min(field) or max(field)")
+            aggregations.append((match.group(1), match.group(2)))
+        return aggregations
+
+
+    def _get_source_fields(self, names):
+        """
+        Returns the Jira fields that need to be fetched to compute the given
+        field names (including names added by _add_composite_fields).
+        """
+        # fields that _add_composite_fields always reads
+        source_fields = ['labels', 'summary', 'status', 'assignee', 'components', 'created', 'updated', self.STORY_POINTS_FIELD]
+        slugs = {slug: key for key, slug in self._auto_custom_field_slugs.items()}
+        for name in names:
+            field = slugs.get(name, name)
+            if field not in source_fields:
+                source_fields.append(field)
+        return source_fields
+
+
+    def _group_value(self, value):
+        """
+        Converts a field value into a string usable as a group name.
+        """
+        if value is None:
+            return ''
+        if isinstance(value, dict):
+            return str(value.get('name', value.get('value', value)))
+        if isinstance(value, list):
+            return ' '.join(self._group_value(v) for v in value)
+        return str(value)
+
+
+    def _group_keys(self, issue, group_by):
+        """
+        Returns the groups an issue belongs to. Issues with several values of a list field
+        (e.g. components_list or labels) belong to one group per value.
+        """
+        values = []
+        for name in group_by:
+            value = issue['fields'].get(self.LIST_GROUP_FIELDS.get(name, name))
+            if isinstance(value, list):
+                values.append(list(dict.fromkeys(self._group_value(item) for item in value)) or [''])
+            else:
+                values.append([self._group_value(value)])
+        return list(itertools.product(*values))
+
+
+    def _aggregate_issues(self, jql, group_by, aggregations, expand=None, changelog_endpoint=False):
+        """
+        Computes aggregations per group in a single streaming pass over the
+        result pages, issues are not kept in memory. When only counts without
+        grouping are asked, a single search with maxResults=0 is enough.
+
+        Args:
+            jql (str): JQL query string.
+            group_by (list): Field names to group by, may be empty.
+            aggregations (list): Tuples (function, field name) as returned by _parse_aggregations.
+            expand (str): Expand parameter of the search.
+            changelog_endpoint (bool): Attach status changelogs read by _get_status_changelog to every page
+                before composite fields (e.g. status_as_of_date) are computed.
+
+        Returns:
+            dict: Tuple of group values mapped to the list of aggregated values.
+        """
+        if not group_by and all(function == 'count' for function, field in aggregations):
+            total = self._count_issues(jql)
+            return {(): [total for aggregation in aggregations]}
+
+        fields = self._get_source_fields(group_by + [field for function, field in aggregations if field])
+        groups = {}
+        non_numeric_fields = set()
+        for page in self._iter_search_pages(jql, expand=expand, fields=fields):
+            if changelog_endpoint:
+                self._attach_status_changelogs(page)
+            for issue in page:
+                self._add_composite_fields(issue)
+                values = []
+                for function, field in aggregations:
+                    value = issue['fields'].get(field) if field else None
+                    if value not in (None, ''):
+                        try:
+                            value = float(value)
+                        except (TypeError, ValueError):
+                            if field not in non_numeric_fields:
+                                non_numeric_fields.add(field)
+                                self._warning(f"Field {field} has non-numeric values (e.g. {value!r} in {issue['key']}), they are ignored by {function}({field}).")
+                            value = None
+                    values.append(None if value == '' else value)
+                for group_key in self._group_keys(issue, group_by):
+                    # per aggregation: count of numeric values, sum, min, max
+                    accumulators = groups.setdefault(group_key, {'count': 0, 'values': [[0, 0.0, None, None] for aggregation in aggregations]})
+                    accumulators['count'] += 1
+                    for accumulator, value in zip(accumulators['values'], values):
+                        if value is None:
+                            continue
+                        accumulator[0] += 1
+                        accumulator[1] += value
+                        accumulator[2] = value if accumulator[2] is None else min(accumulator[2], value)
+                        accumulator[3] = value if accumulator[3] is None else max(accumulator[3], value)
+
+        result = {}
+        for group_key, accumulators in groups.items():
+            row = []
+            for (count, total, minimum, maximum), (function, field) in zip(accumulators['values'], aggregations):
+                row.append({'count': accumulators['count'],
+                            'sum': total,
+                            'avg': round(total / count, 2) if count else None,
+                            'min': minimum,
+                            'max': maximum}[function])
+            result[group_key] = row
+        return result
+
+
+    def _print_aggregation(self, jql, group_by_spec, aggregation_spec, expand=None, changelog_endpoint=False):
+        group_by = [name.strip() for name in (group_by_spec or '').split(',') if name.strip()]
+        aggregations = self._parse_aggregations(aggregation_spec or 'count')
+        result = self._aggregate_issues(jql, group_by, aggregations, expand, changelog_endpoint)
+        print('\t'.join(group_by + [f'{function}({field})' if field else function for function, field in aggregations]))
+        for group_key in sorted(result):
+            print('\t'.join(list(group_key) + ['' if value is None else str(value) for value in result[group_key]]))
+
+
+    def _get_issue_store(self):
+        """
+        Returns the local issue store of the active profile.
+        """
+        path = os.path.join(self._cache_dir, 'issues.sqlite')
+        if path not in self._issue_stores:
+            self._issue_stores[path] = IssueStore(path, self.EPIC_LINK_FIELD, self._json_dumps, self._json_loads)
+        return self._issue_stores[path]
+
+
+    def _parse_jql_date(self, value, now=None):
+        """
+        Converts a JQL date (2023-02-02, 2023/02/02 10:00, or relative like -7d, -2w, -4h) into a timestamp.
+        Absolute dates are taken as UTC. Returns None for anything else.
+        """
+        match = re.fullmatch(r'([-+]?)(\d+)([wdhm])', value)
+        if match:
+            seconds = int(match.group(2)) * {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60}[match.group(3)]
+            return (now or time.time()) + (-seconds if match.group(1) == '-' else seconds)
+        for date_format in ('%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M'):
+            try:
+                return datetime.datetime.strptime(value, date_format).replace(tzinfo=datetime.timezone.utc).timestamp()
+            except ValueError:
+                pass
+        return None
+
+
+    def _parse_local_jql(self, jql, store):
+        """
+        Parses the subset of JQL that the local issue store can evaluate: clauses joined by AND,
+        each comparing a field indexed by the store using =, !=, in, not in (dates also <, <=, >, >=),
+        optionally followed by ORDER BY indexed fields.
+
+        Returns:
+            tuple: (clauses, order_by) for IssueStore.search, or None if the query is not supported.
+        """
+        condition, order_by = self._split_order_by(jql)
+        tokens = []
+        position = 0
+        while position < len(condition):
+            match = JQL_TOKEN_RE.match(condition, position)
+            if not match or match.end() == position:
+                if condition[position:].strip():
+                    return None
+                break
+            position = match.end()
+            double_quoted, single_quoted, operator, word = match.groups()
+            if operator:
+                tokens.append(('op', operator))
+            elif word:
+                tokens.append(('word', word))
+            else:
+                tokens.append(('str', double_quoted if double_quoted is not None else single_quoted))
+
+        def value(token):
+            kind, text = token
+            # unquoted EMPTY, null and functions are not supported
+            if kind == 'op' or (kind == 'word' and text.lower() in ('empty', 'null', 'and', 'or', 'not')):
+                raise ValueError(text)
+            return text
+
+        clauses = []
+        index = 0
+        try:
+            while index < len(tokens):
+                if clauses:
+                    if tokens[index][0] == 'op' or tokens[index][1].lower() != 'and':
+                        return None
+                    index += 1
+                field = value(tokens[index]).lower()
+                operator = tokens[index + 1][1].lower()
+                index += 2
+                if operator == 'not' and tokens[index][1].lower() == 'in':
+                    operator = 'not in'
+                    index += 1
+                if operator in ('in', 'not in'):
+                    if tokens[index] != ('op', '('):
+                        return None
+                    values = []
+                    index += 1
+                    while True:
+                        values.append(value(tokens[index]))
+                        index += 2
+                        if tokens[index - 1] == ('op', ')'):
+                            break
+                        if tokens[index - 1] != ('op', ','):
+                            return None
+                elif operator in ('=', '!=', '<', '<=', '>', '>='):
+                    values = [value(tokens[index])]
+                    index += 1
+                else:
+                    return None
+                if field in store.DATE_FIELDS:
+                    values = [self._parse_jql_date(date) for date in values]
+                    if None in values:
+                        return None
+                elif field not in store.TEXT_FIELDS and field not in store.LIST_FIELDS or operator in ('<', '<=', '>', '>='):
+                    return None
+                clauses.append((field, operator, values))
+        except (IndexError, ValueError):
+            return None
+
+        order = []
+        for item in filter(None, (item.strip() for item in order_by[len('order by'):].split(','))):
+            parts = item.rsplit(None, 1)
+            descending = len(parts) == 2 and parts[1].lower() == 'desc'
+            field = (parts[0] if len(parts) == 2 and parts[1].lower() in ('asc', 'desc') else item).strip('"\'').lower()
+            if field in store.LIST_FIELDS or (field not in store.TEXT_FIELDS and field not in store.DATE_FIELDS):
+                return None
+            order.append((field, descending))
+        return clauses, order
+
+
+    def _local_sync_scopes(self, jql, clauses, store):
+        """
+        Returns lists of store scopes, all scopes of any of the lists contain all issues matching JQL:
+        the JQL condition itself and the keys of projects selected by each project =/in clause.
+        """
+        scopes = [['jql:' + ' '.join(self._split_order_by(jql)[0].split())]]
+        scopes += [['project:' + key for value in values for key in store.project_keys(value)]
+                   for field, operator, values in clauses if store.TEXT_FIELDS.get(field) == 'project' and operator in ('=', 'in')]
+        return scopes
+
+
+    def _record_store_sync(self, jql, store, started):
+        """
+        Records that all issues matching JQL were saved into the store by a sync started at the given time.
+        Queries selecting nothing but projects make the whole projects available to local queries.
+        """
+        parsed = self._parse_local_jql(jql, store)
+        clauses = parsed[0] if parsed else []
+        scopes = self._local_sync_scopes(jql, clauses, store)
+        for scope in scopes[0] + (scopes[1] if len(clauses) == 1 and len(scopes) == 2 else []):
+            store.mark_synced(scope, started)
+            self._debug_print(f'Local issue store has all issues of {scope}')
+
+
+    def _search_local(self, jql, max_results=None, start_at=0, expand=None, max_age=None):
+        """
+        Evaluates JQL using the local issue store.
+
+        Args:
+            max_age (int): Maximum age in seconds of the sync that stored the issues, no limit if not set.
+
+        Returns:
+            list: Matching issues, or None if the query cannot be answered locally
+                  (unsupported JQL, issues of the query not fully synced by export --store,
+                  a sync older than max_age or stored issues without the expanded data).
+        """
+        store = self._get_issue_store()
+        parsed = self._parse_local_jql(jql, store)
+        if parsed is None:
+            self._debug_print(f'JQL not supported locally, asking the server: {jql}')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='issue_store', result='miss')
+            return None
+        # a scope counts when all of its parts were synced, since the oldest of them
+        synced = [min(store.synced(scope) or 0 for scope in scopes) for scopes in self._local_sync_scopes(jql, parsed[0], store)]
+        if not any(synced):
+            self._debug_print(f'Issues of the query were not synced into the local store, asking the server: {jql}')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='issue_store', result='miss')
+            return None
+        if max_age and time.time() - max(synced) > max_age:
+            self._debug_print(f'Last sync of the local store is older than {max_age}s, asking the server')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='issue_store', result='miss')
+            return None
+        issues = store.search(parsed[0], parsed[1], max_results, start_at)
+        expanded = [item.strip() for item in (expand or '').split(',') if item.strip()]
+        if any(item not in issue for issue in issues for item in expanded):
+            self._debug_print(f'Stored issues lack expanded {expand}, asking the server')
+            self._metrics.inc('easyjira_cache_lookups_total', cache='issue_store', result='miss')
+            return None
+        self._debug_print(f'{len(issues)} issues found in the local store for JQL: {jql}')
+        self._metrics.inc('easyjira_cache_lookups_total', cache='issue_store', result='hit')
+        return issues
+
+
+    def _build_errata_index(self, issues):
+        """
+        Builds CVE -> trackers and flaw BZ -> trackers indexes in one pass over security trackers.
+        A tracker read more than once (e.g. requested by ID and found by JQL) is counted once.
+
+        Returns:
+            tuple: (cve index, bz index); CVE index maps a CVE to a dict with descriptions (Counter
+                   of summaries without CVE ids and stream), bzs (set) and trackers (key -> stream),
+                   BZ index maps a flaw BZ to a dict of trackers (key -> stream).
+        """
+        cve_index = collections.defaultdict(lambda: {'descriptions': collections.Counter(), 'bzs': set(), 'trackers': {}})
+        bz_index = collections.defaultdict(dict)
+        for issue in issues:
+            cves, bzs, summary_stripped, stream = self._get_tracker_info(issue)
+            for bz in bzs:
+                bz_index[bz][issue['key']] = stream
+            for cve in cves:
+                entry = cve_index[cve]
+                if issue['key'] not in entry['trackers']:
+                    entry['descriptions'][summary_stripped] += 1
+                entry['trackers'][issue['key']] = stream
+                entry['bzs'].update(bzs)
+        return cve_index, bz_index
+
+
+    def _print_errata(self, issues, ndjson=False):
+        """
+        Prints one line per CVE (and per flaw BZ of trackers without any CVE) with the errata
+        description, flaw BZs, streams and trackers of all streams, tab separated or as NDJSON.
+        """
+        cve_index, bz_index = self._build_errata_index(issues)
+        tracked_bzs = {bz for entry in cve_index.values() for bz in entry['bzs']}
+        cve_order = lambda cve: tuple(int(part) for part in CVE_ID_RE.match(cve).groups()) if CVE_ID_RE.match(cve) else (float('inf'), cve)
+        # bugzilla ids are numbers, bz#99999 goes before bz#100000
+        bz_order = lambda bz: (int(bz), bz) if bz.isdigit() else (float('inf'), bz)
+        records = []
+        for cve in sorted(cve_index, key=cve_order):
+            entry = cve_index[cve]
+            # trackers of different streams may differ in summaries, the most common one describes the flaw
+            description = entry['descriptions'].most_common(1)[0][0]
+            records.append({'id': cve, 'errata_description': f'{description} ({cve})', 'bzs': sorted(entry['bzs'], key=bz_order), 'trackers': entry['trackers']})
+        for bz in sorted(set(bz_index) - tracked_bzs, key=bz_order):
+            records.append({'id': f'bz#{bz}', 'errata_description': None, 'bzs': [bz], 'trackers': bz_index[bz]})
+        for record in records:
+            record['streams'] = sorted({stream for stream in record['trackers'].values() if stream})
+            record['trackers'] = sorted(record['trackers'])
+            if ndjson:
+                print(self._json_dumps(record))
+            else:
+                print('\t'.join([record['id'], record['errata_description'] or '', ' '.join(record['bzs']), ' '.join(record['streams']), ' '.join(record['trackers'])]))
+
+
+    def _read_named_queries(self, named_jql, query_file):
+        """
+        Returns a dict of named queries given as NAME=JQL by --named-jql and lines of --query-file
+        (empty lines and lines starting with # are ignored), in the order they were given.
+        """
+        lines = list(named_jql or [])
+        if query_file:
+            with open(query_file) as f:
+                lines += [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+        queries = {}
+        for line in lines:
+            name, _, jql = line.partition('=')
+            name, jql = name.strip(), jql.strip()
+            if not re.fullmatch(r'[\w.-]+', name) or not jql:
+                self._error(f'Named query must be NAME=JQL with NAME made of letters, digits, _, . and -, got: {line}')
+            if name in queries:
+                self._error(f'Named query {name} given more than once')
+            queries[name] = jql
+        return queries
+
+
+    def _run_named_queries(self, queries, max_results=None, expand=None):
+        """
+        Runs several queries concurrently, reading only keys of the matching issues first,
+        then fetches every distinct issue once, no matter how many queries it matches.
+
+        Returns:
+            tuple: (dict query name -> list of keys in the order of the query, dict key -> issue)
+        """
+        def read_keys(jql):
+            return [issue['key'] for page in self._iter_search_pages(jql, max_results, 0, fields=['key']) for issue in page]
+
+        results = dict(zip(queries, self._run_concurrently(read_keys, list(queries.values()))))
+        distinct_keys = {key for keys in results.values() for key in keys}
+        self._debug_print(f'{sum(len(keys) for keys in results.values())} issues matched {len(queries)} queries, {len(distinct_keys)} distinct')
+        issues = {issue['key']: issue for issue in self._search_issues_by_keys(sorted(distinct_keys), None, expand)}
+        return results, issues
+
+
+    def _print_named_queries(self, queries, args):
+        """
+        Prints results of named queries as NDJSON with the query name in the query key of every issue,
+        or NAME<tab>formatted issue lines with --outputformat. With --output-dir, the results are
+        written into NAME.ndjson (NAME.txt with --outputformat) files in that directory instead.
+        """
+        results, issues = self._run_named_queries(queries, None if args.auto_paginate else args.max_results, args.expand)
+        output_format = self._get_output_format(args) if args.output_format else None
+        for issue in issues.values():
+            self._add_composite_fields(issue)
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        for name, keys in results.items():
+            # an issue may disappear between the two passes
+            found = [issues[key] for key in keys if key in issues]
+            if output_format:
+                lines = [output_format.format(**issue) for issue in found]
+            else:
+                lines = [self._json_dumps(issue if args.output_dir else dict(issue, query=name)) for issue in found]
+            if args.output_dir:
+                path = os.path.join(args.output_dir, name + ('.txt' if output_format else '.ndjson'))
+                with open(path, 'w') as f:
+                    f.writelines(line + '\n' for line in lines)
+                self._debug_print(f'{len(lines)} issues of query {name} written to {path}')
+            else:
+                for line in lines:
+                    print(f'{name}\t{line}' if output_format else line)
+
+
+    def _get_query_jql(self, args):
+        return self._get_jql_from_url(args.from_url) if args.from_url else args.jql
+
+
+    def _iter_query_pages(self, args, fields=None, read_all=False, changelog=False):
+        """
+        Yields pages of issues selected by query arguments (-j, --jql or --from-url).
+
+        Args:
+            args: Parsed query arguments.
+            fields (list): Fields to return for JQL results, all navigable fields if not set.
+            read_all (bool): Read all matching issues, ignoring --max_results and --start_at.
+            changelog (bool): Status changelog is needed, it is attached to every page when --changelog-endpoint is used.
+
+        With --cache, JQL is evaluated by the local issue store when possible, with --store, issues
+        read from the server are saved into the store. Issues read with only some fields are not saved,
+        they would replace complete stored issues.
+        """
+        store = None
+        if args.store:
+            if fields:
+                self._warning('Issues read with only some fields are not saved into the local issue store.')
+            else:
+                store = self._get_issue_store()
+        def pages():
+            if args.id:
+                yield [self._get_issue(issue, args.expand) for issue in args.id]
+            jql = self._get_query_jql(args)
+            if jql:
+                max_results = None if read_all or args.auto_paginate else args.max_results
+                start_at = 0 if read_all else args.start_at
+                local_issues = self._search_local(jql, max_results, start_at, args.expand, args.cache_max_age) if args.cache else None
+                if local_issues is not None:
+                    if local_issues:
+                        yield local_issues
+                    return
+                for page in self._iter_search_pages(jql, max_results, start_at, args.expand, fields):
+                    if store:
+                        store.put(page)
+                    yield page
+        for page in pages():
+            if changelog and args.changelog_endpoint:
+                self._attach_status_changelogs(page)
+            yield page
+
+
+    def _get_output_format(self, args):
+        if args.output_format:
+            # use codecs to interpret escape characters
+            return self._resolve_output_format(codecs.escape_decode(bytes(args.output_format, "utf-8"))[0].decode("utf-8"))
+        return self._default_output
+
+
+    def _get_issue_edges(self, issue, link_types=None, direction='both', follow=('links', 'subtasks', 'epics')):
+        """
+        Returns edges (from key, relation, to key) of an issue's links, subtasks, parent and epic link.
+        Links are always reported in their outward direction, e.g. (A, 'blocks', B), no matter
+        from which side they were read, so the same link read from both issues is one edge.
+
+        Args:
+            issue (dict): Issue with issuelinks, subtasks, parent and epic link fields.
+            link_types (list): Link types to follow (names, e.g. Blocks, or outward/inward texts), all if not set.
+            direction (str): Follow outward, inward or both directions of links.
+            follow (tuple): What relations to follow: links, subtasks, epics.
+        """
+        key = issue['key']
+        fields = issue.get('fields', {})
+        edges = []
+        if 'links' in follow:
+            wanted = {t.lower() for t in link_types} if link_types else None
+            for link in fields.get('issuelinks') or []:
+                link_type = link['type']
+                if wanted and not wanted & {link_type['name'].lower(), link_type['inward'].lower(), link_type['outward'].lower()}:
+                    continue
+                if 'outwardIssue' in link and direction in ('outward', 'both'):
+                    edges.append((key, link_type['outward'], link['outwardIssue']['key']))
+                if 'inwardIssue' in link and direction in ('inward', 'both'):
+                    edges.append((link['inwardIssue']['key'], link_type['outward'], key))
+        if 'subtasks' in follow:
+            for subtask in fields.get('subtasks') or []:
+                edges.append((key, 'has subtask', subtask['key']))
+            if fields.get('parent'):
+                edges.append((fields['parent']['key'], 'has subtask', key))
+        if 'epics' in follow and fields.get(self.EPIC_LINK_FIELD):
+            edges.append((fields[self.EPIC_LINK_FIELD], 'has epic child', key))
+        return edges
+
+
+    def _walk_issue_graph(self, roots, depth, link_types=None, direction='both', follow=('links', 'subtasks', 'epics')):
+        """
+        Walks the graph of linked issues breadth-first up to the given depth.
+
+        Every level is fetched with batched concurrent 'key in (...)' searches, issues are
+        fetched once no matter how many times they are reached, epic children are found by
+        searching epic links of the whole level at once.
+
+        Returns:
+            tuple: (dict of key to issue, list of unique edges in the order they were found)
+        """
+        fields = ['summary', 'status', 'issuetype', 'issuelinks', 'subtasks', 'parent', self.EPIC_LINK_FIELD]
+        issues = {}
+        edges = {}
+        visited = set(roots)
+        frontier = list(roots)
+        for level in range(depth + 1):
+            missing = [key for key in frontier if key not in issues]
+            issues.update({issue['key']: issue for issue in self._search_issues_by_keys(missing, fields)})
+            if level == depth:
+                break
+            level_edges = [edge for key in frontier if key in issues for edge in self._get_issue_edges(issues[key], link_types, direction, follow)]
+            if 'epics' in follow:
+                # children are one level further, like link targets, only the edge to their epic belongs to this level
+                for child in self._search_issues_by_keys(frontier, fields, jql_field=self._get_epic_link_jql_field()):
+                    issues.setdefault(child['key'], child)
+                    level_edges.append((child['fields'][self.EPIC_LINK_FIELD], 'has epic child', child['key']))
+            next_frontier = []
+            for edge in level_edges:
+                edges[edge] = True
+                for key in (edge[0], edge[2]):
+                    if key not in visited:
+                        visited.add(key)
+                        next_frontier.append(key)
+            self._debug_print(f'Graph level {level + 1}: {len(next_frontier)} new issues')
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return issues, list(edges)
+
+
+    def _print_issue_graph(self, issues, edges, output):
+        if output == 'json':
+            nodes = {key: {'summary': issue['fields'].get('summary'), 'status': (issue['fields'].get('status') or {}).get('name')} for key, issue in issues.items()}
+            print(self._json_dumps({'nodes': nodes, 'edges': [{'from': a, 'relation': relation, 'to': b} for a, relation, b in edges]}, pretty=True))
+        elif output == 'dot':
+            print('digraph issues {')
+            for key in sorted(issues):
+                label = '{}\\n{}'.format(key, (issues[key]['fields'].get('status') or {}).get('name', ''))
+                print(f'  "{key}" [label="{label}"];')
+            for a, relation, b in edges:
+                print(f'  "{a}" -> "{b}" [label="{relation}"];')
+            print('}')
+        else:
+            for a, relation, b in edges:
+                print(f'{a}\t{relation}\t{b}')
+
+
+    def _get_epic_link_jql_field(self):
+        return 'cf[{}]'.format(self.EPIC_LINK_FIELD.replace('customfield_', ''))
+
+
+    def _get_issue_parent(self, issue, known_issues):
         """
-        Retrieves the field mapping for a specific issue type in a project.
+        Returns the key of the parent of an issue among known issues, which is either the parent (for subtasks) or the epic.
+        """
+        fields = issue['fields']
+        for parent in ((fields.get('parent') or {}).get('key'), fields.get(self.EPIC_LINK_FIELD)):
+            if parent in known_issues:
+                return parent
+        return None
 
-        Makes a GET request to the Jira API to fetch the field mapping
-        for the given issue type in the specified project. Returns a
-        dictionary mapping field IDs to their corresponding names.
 
-        Args:
-            project (str): The key or ID of the project.
-            issue_type (str): The name of the issue type.
-            only_required (bool): Flag to include only required fields in the mapping.
+    def _get_rollups(self, roots):
+        """
+        Fetches the whole hierarchy under given epics/parents and computes rolled-up numbers.
+
+        Every level of the hierarchy is fetched by one set of batched searches matching
+        both parent and epic link, so the number of searches depends on the depth of
+        the hierarchy, not on the number of issues.
 
         Returns:
-            dict: A dictionary mapping field IDs to their names.
+            list: One dict per root with key, summary, issues, done_issues, points, done_points,
+                  completion (percent of points, or of issues when there are no points) and statuses.
         """
-        issue_types = self._get_issue_types(project)
-        mapping = {}
-        # TODO: createmeta only shows some subset of fields, we should rather use editmeta,
-        # but we need some ticket for that -- that can be done by querying any issue of the
-        # specific type and ask about that particular issue
-        # {self.JIRA_REST_URL}/issue/{issue}/editemeta?expand=projects.issuetypes.fields
-        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/createmeta/{project}/issuetypes/{issue_types[issue_type]}")
-        data = r.json()
-        try:
-            mapping = { field['fieldId']:field['name'] for field in data['values'] if field['required'] or not only_required }
-        except (KeyError, IndexError):
-            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
-            self._error(f'Data not found. It is possible that project {project} has no issue type {issue_type}. Reason given by Jira: {reason}')
-        return mapping
+        fields = ['summary', 'status', 'issuetype', 'parent', self.EPIC_LINK_FIELD, self.STORY_POINTS_FIELD]
+        issues = {issue['key']: issue for issue in self._search_issues_by_keys(roots, fields)}
+        children = {}
+        frontier = list(roots)
+        while frontier:
+            next_frontier = []
+            for child in self._search_issues_by_keys(frontier, fields, jql_field=('parent', self._get_epic_link_jql_field())):
+                if child['key'] in issues:
+                    continue
+                issues[child['key']] = child
+                children.setdefault(self._get_issue_parent(child, issues), []).append(child['key'])
+                next_frontier.append(child['key'])
+            frontier = next_frontier
+
+        rollups = []
+        for root in roots:
+            rollup = {'key': root, 'summary': issues[root]['fields']['summary'] if root in issues else None,
+                      'issues': 0, 'done_issues': 0, 'points': 0.0, 'done_points': 0.0, 'statuses': {}}
+            stack = list(children.get(root, []))
+            while stack:
+                key = stack.pop()
+                stack.extend(children.get(key, []))
+                fields = issues[key]['fields']
+                points = float(fields.get(self.STORY_POINTS_FIELD) or 0)
+                done = fields['status'].get('statusCategory', {}).get('key') == 'done'
+                status = fields['status']['name']
+                rollup['issues'] += 1
+                rollup['points'] += points
+                rollup['statuses'][status] = rollup['statuses'].get(status, 0) + 1
+                if done:
+                    rollup['done_issues'] += 1
+                    rollup['done_points'] += points
+            if rollup['points']:
+                rollup['completion'] = round(100 * rollup['done_points'] / rollup['points'], 1)
+            else:
+                rollup['completion'] = round(100 * rollup['done_issues'] / rollup['issues'], 1) if rollup['issues'] else None
+            rollups.append(rollup)
+        return rollups
 
 
-    def _get_teams_for_issue(self, jira_id):
+    def cmd_rollup(self, args):
         """
-        Retrieves the teams list for a specific issue (usable in RHEL* projects)
+        Command handler for printing rolled-up story points and statuses of epics or parents.
         """
-        teams = {}
-        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{jira_id}/editmeta?fields=customfield_12326540")
-        data = r.json()
-        try:
-            teams = { team['value']:team['id'] for team in data['fields']['customfield_12326540']['allowedValues'] }
-        except (KeyError, IndexError):
-            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
-            self._error(f'Data not found. It is possible that project {project} has no field customfield_12326540. Reason given by Jira: {reason}')
-        return teams
+        rollups = self._get_rollups(args.id)
+        if args.output == 'json':
+            print(self._json_dumps(rollups, pretty=True))
+            return
+        columns = ['key', 'issues', 'done_issues', 'points', 'done_points', 'completion']
+        print('\t'.join(columns + ['statuses', 'summary']))
+        for rollup in rollups:
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(rollup['statuses'].items()))
+            print('\t'.join(['' if rollup[column] is None else str(rollup[column]) for column in columns] + [statuses, rollup['summary'] or '']))
 
 
-    def _get_fields_mapping_for_issue(self, jira_id, only_required=False):
+    def _count_issues(self, jql):
         """
-        Retrieves the field mapping for a specific issue type in a project.
+        Returns the number of issues matching JQL using a search that returns no issues.
+        """
+        query = urllib.parse.urlencode([('jql', jql), ('maxResults', 0)])
+        r = self._api_request('get', f"{self.JIRA_REST_URL}/search", params=query)
+        self._write_api_calls("total = response.json()['total']")
+        if not r.ok:
+            self._report_api_failure(r)
+            self._error(f'Searching issues failed for JQL: {jql}')
+        return self._response_json(r)['total']
 
-        Works similarly to _get_fields_mapping, except the project and issue
-        type is specified by a concrete issue.
 
-        See _get_fields_mapping for more information.
-        """
-        mapping = {}
-        r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{jira_id}/editmeta?expand=projects.issuetypes.fields")
-        data = r.json()
-        try:
-            mapping = { key:data['fields'][key]['name'] for key in data['fields'] if data['fields'][key]['required'] or not only_required }
-        except (KeyError, IndexError):
-            reason = 'unknown' if 'errorMessages' not in data else data['errorMessages'][0]
-            self._error(f'Data not found. It is possible that project {project} has no issue type {issue_type}. Reason given by Jira: {reason}')
-        return mapping
+    def _get_first_issue(self, jql, fields):
+        pages = self._iter_search_pages(jql, 1, 0, None, fields)
+        return next((page[0] for page in pages), None)
 
 
-    def _get_jql_from_url(self, url) -> str:
+    def _get_shard_range(self, condition, shard_by):
         """
-        Extracts the JQL (Jira Query Language) from a given URL.
+        Finds the range of values of the shard field among issues matching the condition.
+
+        Returns:
+            tuple: (lowest value, highest value + 1, project key for key sharding), values are
+                   minutes since epoch for created and issue numbers for key; None for no issues.
         """
-        url_parsed = urllib.parse.urlparse(url)
-        jql = ''
-        if url_parsed.query != '':
-            for url_query in urllib.parse.parse_qsl(url_parsed.query):
-                if url_query[0] == 'filter' and len(url_query) == 2:
-                    jql = 'filter={}'.format(url_query[1])
-                elif url_query[0] == 'jql' and len(url_query) == 2:
-                    # not sure how we can only encode the value
-                    jql = url_query[1]
-        self._debug_print("JQL parsed from URL: '{}'".format(jql))
-        return jql
+        if shard_by == 'key':
+            first = self._get_first_issue(f'{condition} ORDER BY key ASC', ['key'])
+            last = self._get_first_issue(f'{condition} ORDER BY key DESC', ['key'])
+            if not first:
+                return None
+            project, low = first['key'].rsplit('-', 1)
+            last_project, high = last['key'].rsplit('-', 1)
+            if project != last_project:
+                self._error('Sharding by key works for a single project only, use --shard-by created.')
+            return int(low), int(high) + 1, project
+        first = self._get_first_issue(f'{condition} ORDER BY created ASC', ['created'])
+        if not first:
+            return None
+        # JQL dates are in the user's time zone, one day margin on both sides covers any offset
+        low = int(self._parse_timestamp(first['fields']['created']).timestamp() // 60) - 24 * 60
+        high = int(time.time() // 60) + 24 * 60
+        return low, high, None
 
 
-    def cmd_fields_mapping(self, args):
-        """
-        Command handler for retrieving and printing field mappings.
-        """
-        if args.id:
-            mapping = self._get_fields_mapping_for_issue(args.id, args.only_required)
+    def _get_shard_jql(self, condition, shard_by, low, high, project=None):
+        if shard_by == 'key':
+            shard = f'key >= "{project}-{low}" AND key < "{project}-{high}"'
         else:
-            mapping = self._get_fields_mapping(args.project, args.issue_type, args.only_required)
-        print(json.dumps(mapping, sort_keys=True, indent=4))
+            to_jql = lambda minute: datetime.datetime.fromtimestamp(minute * 60, datetime.timezone.utc).strftime("%Y/%m/%d %H:%M")
+            shard = f'created >= "{to_jql(low)}" AND created < "{to_jql(high)}"'
+        return self._and_jql(condition, shard)
 
 
-    def _get_issues(self, ids=None, from_url=None, jql=None, max_results=None, start_at=0, expand=None, auto_paginate=None):
+    def _plan_shards(self, condition, shard_by, shard_size):
         """
-        Retrieves issues based on issue IDs, a URL with a query, or
-        a JQL query. Returns a list of issues.
-
-        Args:
-            ids (list): List of issue IDs.
-            from_url (str): URL containing a query.
-            jql (str): JQL query string.
-            max_results (int): Maximum number of results to retrieve.
-            start_at (int): Index of the first result to retrieve.
+        Splits the range of the shard field in halves until every shard matches
+        at most shard_size issues. Shards of one level are counted concurrently.
 
         Returns:
-            list: A list of issues.
+            list: JQL of every non-empty shard, ordered by the shard field.
         """
-        output=[]
+        shard_range = self._get_shard_range(condition, shard_by)
+        if not shard_range:
+            return []
+        low, high, project = shard_range
+        pending = [(low, high)]
+        shards = []
+        while pending:
+            counts = self._run_concurrently(lambda r: self._count_issues(self._get_shard_jql(condition, shard_by, r[0], r[1], project)), pending)
+            next_pending = []
+            for (low, high), count in zip(pending, counts):
+                if count > shard_size and high - low > 1:
+                    middle = (low + high) // 2
+                    next_pending += [(low, middle), (middle, high)]
+                elif count:
+                    shards.append((low, high))
+            self._debug_print(f'Shards planned: {len(shards)}, to be split: {len(next_pending)}')
+            pending = next_pending
+        return [self._get_shard_jql(condition, shard_by, low, high, project) for low, high in sorted(shards)]
+
+
+    def _read_exported_keys(self, output):
+        """
+        Returns keys of issues already written to an export file.
+        """
+        with self._open_for_reading(output) as f:
+            return {self._json_loads(line)['key'] for line in f if line.strip()}
 
-        # get issues based on ID
-        if ids:
-            for issue in ids:
-                output.append(self._get_issue(issue, expand))
 
-        # get issues based on url with a query
-        if from_url:
-            jql = self._get_jql_from_url(from_url)
+    def _export_issues(self, jql, output, shard_by='created', shard_size=None, expand=None, fields=None, resume=False, store=None):
+        """
+        Exports all issues matching JQL into a file as NDJSON, one issue per line.
 
-        # get issues based on jql only
-        if jql:
-            jql_issues = []
-            # no matter how big maxResults is, Jira returns only 1000 issues, so let's repeat the query if needed
-            while max_results > len(jql_issues):
-                param_list = [('jql',jql), ('maxResults', max_results), ('startAt', start_at)]
-                start_at = start_at + 1000 if start_at else 1000
-                if expand:
-                    param_list.append(('expand', expand))
-                query = urllib.parse.urlencode(param_list)
-                r = self._api_request('get', f"{self.JIRA_REST_URL}/search", params=query)
-                self._write_api_calls("issues = response.json()['issues']")
-                if r.ok:
-                    jql_issues += r.json()['issues']
-                output += jql_issues
-                # stop the cycle if we return less than the hard limit of Jira is
-                if len(jql_issues) < 1000:
-                    break
+        The query is split into shards small enough to be read without deep pagination,
+        shards are fetched concurrently and written in order as soon as they are complete,
+        issues that appear in several shards (e.g. moved during the export) are written once.
 
-        return output
+        After every written shard, a checkpoint file (output + '.checkpoint') stores the planned
+        shards, how many of them are written and the size of the output at that point, along with the
+        compression, fields and expand, which must not change when resuming. With resume,
+        the output is cut to that size, so a shard written only partially is written again, and
+        the export continues with the next shard. The checkpoint is removed when the export is done.
+
+        If an IssueStore is given, exported issues are saved into it as well.
+
+        Returns:
+            int: Number of written issues.
+        """
+        condition, order_by = self._split_order_by(jql)
+        checkpoint_path = output + '.checkpoint'
+        checkpoint = self._read_cache_file(checkpoint_path) if resume else None
+        if resume and not checkpoint:
+            self._error(f'Cannot resume, checkpoint {checkpoint_path} not found or not readable.')
+        if checkpoint:
+            if checkpoint['jql'] != jql or checkpoint['shard_by'] != shard_by:
+                self._error(f'Cannot resume, checkpoint {checkpoint_path} was created for a different query.')
+            for option, value in (('compress', self._compress), ('fields', fields), ('expand', expand)):
+                # records appended by the resumed export must have the same shape and compression
+                if checkpoint.get(option) != value:
+                    self._error(f"Cannot resume, checkpoint {checkpoint_path} was created with {option} {checkpoint.get(option)}, not {value}.")
+            if not os.path.exists(output) or os.path.getsize(output) < checkpoint['offset']:
+                self._error(f"Cannot resume, {output} is missing or shorter than the {checkpoint['offset']} bytes already exported, remove {checkpoint_path} and export again.")
+            os.truncate(output, checkpoint['offset'])
+            seen = self._read_exported_keys(output)
+            self._debug_print(f"Resuming export at shard {checkpoint['completed']} of {len(checkpoint['shards'])}, {len(seen)} issues already exported")
+        else:
+            checkpoint = {'jql': jql, 'shard_by': shard_by, 'compress': self._compress, 'fields': fields, 'expand': expand, 'shards': self._plan_shards(condition, shard_by, shard_size or self.SEARCH_PAGE_SIZE), 'completed': 0, 'offset': 0}
+            open(output, 'wb').close()
+            self._write_cache_file(checkpoint_path, checkpoint)
+            seen = set()
+        shards = checkpoint['shards']
+        self._debug_print(f'Exporting {len(shards)} shards')
+
+        fetch_shard = lambda shard_jql: [issue for page in self._iter_search_pages(f'{shard_jql} ORDER BY key ASC', None, 0, expand, fields) for issue in page]
+        workers = max(self._concurrency, 1)
+        def fetched_shards(executor):
+            # shards are fetched concurrently and returned in order, only a few shards per worker are
+            # in flight, so shards completed ahead of the one being written do not pile up in memory
+            pending = collections.deque()
+            for shard_jql in shards[checkpoint['completed']:]:
+                pending.append(executor.submit(fetch_shard, shard_jql))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+        with open(output, 'ab') as f:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for index, shard_issues in enumerate(fetched_shards(executor), checkpoint['completed']):
+                    lines = []
+                    if store:
+                        store.put(shard_issues)
+                    for issue in shard_issues:
+                        if issue['key'] in seen:
+                            continue
+                        seen.add(issue['key'])
+                        lines.append(self._json_dumps(issue))
+                    if lines:
+                        # every shard is compressed separately, so the file can be cut after any shard
+                        f.write(self._compress_bytes(('\n'.join(lines) + '\n').encode('utf-8')))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    checkpoint['completed'] = index + 1
+                    checkpoint['offset'] = f.tell()
+                    self._write_cache_file(checkpoint_path, checkpoint)
+        os.remove(checkpoint_path)
+        return len(seen)
+
+
+    def cmd_export(self, args):
+        """
+        Command handler for exporting all issues matching a query into a file.
+        """
+        jql = self._get_query_jql(args)
+        if not jql:
+            self._error('export requires --jql or --from-url')
+        fields = args.fields.split(',') if args.fields else None
+        store = None
+        if args.store:
+            if fields:
+                self._warning('Issues exported with only some fields are not saved into the local issue store.')
+            else:
+                store = self._get_issue_store()
+        started = time.time()
+        count = self._export_issues(jql, args.output, args.shard_by, args.shard_size, args.expand, fields, args.resume, store)
+        if store:
+            self._record_store_sync(jql, store, started)
+        print(f'{count} issues exported to {args.output}.')
+
+
+    def cmd_graph(self, args):
+        """
+        Command handler for walking and printing the graph of linked issues.
+        """
+        follow = [item.strip() for item in args.follow.split(',')]
+        link_types = [self.link_data[t]['name'] if t in self.link_data else t for t in args.link_types.split(',')] if args.link_types else None
+        issues, edges = self._walk_issue_graph(args.id, args.depth, link_types, args.direction, follow)
+        self._print_issue_graph(issues, edges, args.output)
 
 
     def cmd_query(self, args):
@@ -560,25 +2788,62 @@ class EasyJira:
         Command handler for querying and printing issues.
         """
         # if asking for transition changelog, we must retrieve changelog
-        if args.transitions_changelog or args.transitions_stats or args.status_as_of_date:
+        need_changelog = args.transitions_changelog or args.transitions_stats or args.status_as_of_date != 'now' or args.cycle_time or args.time_in_status
+        if need_changelog and not args.changelog_endpoint:
             if not args.expand:
                 args.expand = 'changelog'
             elif 'changelog' not in args.expand.split(','):
                 args.expand += ',changelog'
 
-        output = self._get_issues(args.id, args.from_url, args.jql, args.max_results, args.start_at, args.expand, args.auto_paginate)
+        if args.stages_file:
+            self._load_stages_file(args.stages_file)
 
-        if len(output) == 1000:
-            self._warning("Exactly 1000 issues were returned, the list might not be complete, because 1000 is hard limit in Jira API")
+        if args.cycle_time or args.time_in_status:
+            group_by = [name.strip() for name in (args.group_by or '').split(',') if name.strip()]
+            pages = self._iter_query_pages(args, self._get_source_fields(group_by), read_all=True, changelog=True)
+            self._print_cycle_time(pages, group_by, args.time_in_status)
+            return
 
-        if args.output_format:
-            # use codecs to interpret escape characters
-            output_format = codecs.escape_decode(bytes(args.output_format, "utf-8"))[0].decode("utf-8")
-        else:
-            output_format = self._default_output
+        if args.watch:
+            jql = self._get_query_jql(args)
+            if not jql:
+                self._error('--watch requires --jql or --from-url')
+            while True:
+                self._print_watch_events(self._watch_query(args.watch, jql, args.expand))
+                if not args.watch_interval:
+                    return
+                time.sleep(args.watch_interval)
+
+        if args.errata:
+            pages = self._iter_query_pages(args, ['summary', 'labels'], read_all=True)
+            self._print_errata((issue for page in pages for issue in page), args.ndjson)
+            return
+
+        if args.group_by or args.agg:
+            jql = self._get_query_jql(args)
+            if not jql:
+                self._error('--group-by and --agg require --jql or --from-url')
+            self._print_aggregation(jql, args.group_by, args.agg, args.expand, need_changelog and args.changelog_endpoint)
+            return
+
+        if args.named_jql or args.query_file:
+            if args.id or args.jql or args.from_url:
+                self._error('--named-jql and --query-file cannot be combined with --id, --jql or --from-url')
+            self._print_named_queries(self._read_named_queries(args.named_jql, args.query_file), args)
+            return
+
+        # issues are processed page by page and not kept after they are printed
+        fields = self._get_source_fields(self._resolve_field_names(args.fields.split(','))) if args.fields else None
+        output_format = self._get_output_format(args)
+        if args.workers > 1:
+            self._print_pages_in_processes(self._iter_query_pages(args, fields, changelog=need_changelog), args, output_format)
+            return
+        output = (issue for page in self._iter_query_pages(args, fields, changelog=need_changelog) for issue in page)
 
         if args.raw:
             self._print_raw_issues(output)
+        elif args.ndjson:
+            self._print_ndjson_issues(output)
         elif args.transitions_changelog:
             self._print_transitions_changelog(output)
         elif args.transitions_stats:
@@ -593,17 +2858,13 @@ class EasyJira:
         if not r.ok:
             print(r.text)
             self._error('Issue NOT created.')
-        new_issue = r.json()
+        new_issue = self._response_json(r)
         # Re-load the whole issue again to allow show other fields than key and id
         new_issue = self._get_issue(new_issue['key'], None)
-        if args.output_format:
-            # use codecs to interpret escape characters
-            output_format = codecs.escape_decode(bytes(args.output_format, "utf-8"))[0].decode("utf-8")
-        else:
-            output_format = self._default_output
+        output_format = self._get_output_format(args)
 
         if args.raw:
-            self._print_raw_issues(new_issue)
+            self._print_raw_issues([new_issue])
         else:
             self._print_issue(output_format, new_issue)
 
@@ -640,31 +2901,41 @@ class EasyJira:
                 self._error("Specify either --description or --description_file, but not both")
             input_fields['description'] = args.description or self._get_file_content(args.description_file)
             input_data = {'fields': input_fields}
-        self._debug_print(json.dumps(input_data, sort_keys=True, indent=4))
+        self._debug_print(self._json_dumps(input_data, pretty=True))
         self._create_issue(input_data, args)
 
 
     def _process_query_links(self, input_data, args):
-        if args.link_type and args.link_issue:
-            # ensure we only add to existing fields that are created if not exist initially
-            if "update" not in input_data:
-                input_data["update"] = {}
-            if "issuelinks" not in input_data["update"]:
-                input_data["update"]["issuelinks"] = []
-
-            input_data["update"]["issuelinks"].append(self._get_link_data(args.link_type, args.link_issue))
+        """
+        Returns a copy of input_data with the link given by --link-type and --link-issue added,
+        input_data itself is never changed, so it can be shared by all updated issues.
+        """
+        if not (args.link_type and args.link_issue):
             return input_data
+        input_data = copy.deepcopy(input_data)
+        # ensure we only add to existing fields that are created if not exist initially
+        input_data.setdefault("update", {}).setdefault("issuelinks", []).append(self._get_link_data(args.link_type, args.link_issue))
+        return input_data
 
 
     def _update_issue(self, issue, input_data, args):
+        """
+        Updates one issue.
+
+        Returns:
+            dict: Result of the update with key, ok, and status and reason for failures.
+        """
         input_data = self._process_query_links(input_data, args)
         self._debug_print(f'Issue {issue} being updated with: {input_data}')
         r = self._api_request('put', f"{self.JIRA_REST_URL}/issue/{issue}", json=input_data)
         if r.ok:
-            print(f'Issue {issue} updated.')
-        else:
+            if not args.json_summary:
+                print(f'Issue {issue} updated.')
+            return {'key': issue, 'ok': True}
+        if not args.json_summary:
             self._report_api_failure(r)
-            self._error(f'Issue {issue} NOT updated.')
+            print(f'Issue {issue} NOT updated.')
+        return {'key': issue, 'ok': False, 'status': r.status_code, 'reason': r.reason, 'text': r.text}
 
 
     def cmd_update(self, args):
@@ -692,26 +2963,89 @@ class EasyJira:
                 input_data = json.load(f)
         else:
             input_data = {}
-        if args.id:
-            for issue in args.id:
-                self._update_issue(issue, input_data, args)
 
+        # pairs of issue and its payload, --jsonl_file lines carry own payload: {"key": "RHEL-1", "fields": {...}}
+        updates = [(issue, input_data) for issue in (args.id or [])]
+        if args.jsonl_file:
+            for number, row in enumerate(self._read_rows(args.jsonl_file), 1):
+                payload = dict(row)
+                if not payload.get('key'):
+                    self._error(f'Line {number} of {args.jsonl_file} has no "key" of the issue to update.')
+                updates.append((payload.pop('key'), payload))
+
+        results = self._run_concurrently(lambda update: self._update_issue(update[0], update[1], args), updates)
+        failed = [result for result in results if not result['ok']]
+        if args.json_summary:
+            # the summary is the only output, failures are signalled by the exit code
+            print(self._json_dumps({'updated': [result['key'] for result in results if result['ok']], 'failed': failed}, pretty=True))
+            if failed:
+                sys.exit(1)
+        elif failed:
+            self._error('{} of {} issues NOT updated: {}'.format(len(failed), len(results), ' '.join(result['key'] for result in failed)))
+
+
+    def _compile_regex(self, pattern):
+        """
+        Returns a compiled regular expression, every pattern is compiled only once.
+        """
+        if pattern not in self._regex_cache:
+            self._regex_cache[pattern] = re.compile(pattern)
+        return self._regex_cache[pattern]
 
-    def _replace_re(self, original_value, key, args):
-        if args.set:
-            set_data = json.loads(args.set, strict=False)
-            output = set_data[key] if key in set_data else original_value
-        else:
-            output = original_value
-        if args.re:
-            replace_data = json.loads(args.re)
-            if key in replace_data:
-                replace_data_key = replace_data[key] if type(replace_data[key]) == list else [replace_data[key]]
-                for repl in replace_data_key:
-                    output = re.sub(repl['pattern'], repl['replacement'], output)
+
+    def _substitute_row(self, value, row):
+        """
+        Replaces $name placeholders in all strings of a parsed JSON structure by values from row.
+        """
+        if isinstance(value, str):
+            return string.Template(value).safe_substitute(row)
+        if isinstance(value, list):
+            return [self._substitute_row(v, row) for v in value]
+        if isinstance(value, dict):
+            return {k: self._substitute_row(v, row) for k, v in value.items()}
+        return value
+
+
+    def _compile_clone_rules(self, set_data, re_data):
+        """
+        Prepares --set and --re data for cloning, so the regular expressions
+        are compiled once and not for every field of every clone.
+
+        Args:
+            set_data (dict): Parsed --set data, field name to the new value.
+            re_data (dict): Parsed --re data, field name to a dict (or list of dicts) with pattern and replacement.
+
+        Returns:
+            dict: 'set' with values to set and 're' with a list of (compiled pattern, replacement) per field.
+        """
+        rules = {'set': set_data or {}, 're': {}}
+        for key, repl_list in (re_data or {}).items():
+            repl_list = repl_list if type(repl_list) == list else [repl_list]
+            rules['re'][key] = [(self._compile_regex(repl['pattern']), repl['replacement']) for repl in repl_list]
+        return rules
+
+
+    def _replace_re(self, original_value, key, rules):
+        output = rules['set'][key] if key in rules['set'] else original_value
+        if isinstance(output, str):
+            for pattern, replacement in rules['re'].get(key, []):
+                output = pattern.sub(replacement, output)
         return output
 
 
+    def _read_rows(self, filename):
+        """
+        Reads a table of rows from a CSV file with a header or from a JSONL file (one object per line).
+
+        Returns:
+            list: A list of dicts, one per row.
+        """
+        with open(filename, newline='') as f:
+            if filename.endswith('.csv'):
+                return [dict(row) for row in csv.DictReader(f)]
+            return [self._json_loads(line) for line in f if line.strip()]
+
+
     def _get_link_data(self, link_type, issue):
         """
         Returns a valid dictionary structure for a given link type and issue ID
@@ -733,51 +3067,142 @@ class EasyJira:
         return link_data_output
 
 
-    def cmd_clone(self, args):
+    def _get_teams_for_issue_cached(self, jira_id):
+        if jira_id not in self._teams_cache:
+            self._teams_cache[jira_id] = self._get_teams_for_issue(jira_id)
+        return self._teams_cache[jira_id]
+
+
+    def _build_clone_data(self, original, rules, args):
         """
-        Clone an issue with some logic for keeping, changing and removing some specific fields.
+        Creates the data for a new issue from the original issue and the prepared clone rules.
         """
-        issue = args.id
-        original = self._get_issue(issue, None)
+        issue = original['key']
         original_fields = original['fields']
 
         # start with what is set explicitly by --set
-        input_fields = json.loads(args.set, strict=False) if args.set else {}
+        input_fields = dict(rules['set'])
 
         # get fields that must be replaced (whether they are replaced or not depends also on --re content)
         fields_for_replace = ['summary', 'description']
-        # customfield_12311140 is epic link
         # customfield_12316142 is severity, but not added actually as it's not available for creation for RHEL project for example, use --copy_fields customfield_12316142 instead
-        for field in ['project', 'issuetype', 'duedate','priority', 'customfield_12311140']:
+        for field in ['project', 'issuetype', 'duedate','priority', self.EPIC_LINK_FIELD]:
             if field not in input_fields:
                 fields_for_replace.append(field)
 
         # copy or replace fields
         for field in fields_for_replace + (args.copy_fields if args.copy_fields else []):
-            input_fields[field] = self._replace_re(original_fields[field], field, args)
+            input_fields[field] = self._replace_re(original_fields[field], field, rules)
 
         # we need some manual setting of teams
         if 'AssignedTeam' in input_fields:
             team_name = input_fields['AssignedTeam']
-            team_id = self._get_teams_for_issue(issue)[team_name]
+            team_id = self._get_teams_for_issue_cached(issue)[team_name]
             del(input_fields['AssignedTeam'])
             input_fields['customfield_12326540'] = {
                 "disabled": "false",
                 "id": str(team_id),
-                "self": "https://issues.redhat.com/rest/api/2/customFieldOption/{}".format(team_id),
+                "self": "{}/customFieldOption/{}".format(self.JIRA_REST_URL, team_id),
                 "value": team_name
             }
 
         clon_data = {'fields': input_fields}
-        #pprint.pprint(clon_data)
 
         # add a link to the original
         if not args.no_link_back:
             clon_data["update"] = {
-              "issuelinks": [ self._get_link_data('clones', args.id) ]
+              "issuelinks": [ self._get_link_data('clones', issue) ]
             }
+        return clon_data
+
+
+    def _search_issues_by_keys(self, keys, fields=None, expand=None, jql_field='key'):
+        """
+        Retrieves issues by keys using batched 'key in (...)' searches run concurrently,
+        which is much cheaper than fetching issues one by one.
+
+        Args:
+            keys (list): Issue keys.
+            fields (list): Fields to return, all navigable fields if not set.
+            expand (str): Value passed as expand parameter.
+            jql_field (str or tuple): Field compared with the keys, e.g. parent or cf[12311140] (epic link)
+                to find children of the given issues, several fields are combined with OR.
+
+        Returns:
+            list: Found issues, in no particular order.
+        """
+        jql_fields = (jql_field,) if isinstance(jql_field, str) else jql_field
+        def search_batch(batch):
+            jql = ' OR '.join('{} in ({})'.format(field, ','.join(batch)) for field in jql_fields)
+            return [issue for page in self._iter_search_pages(jql, None, 0, expand, fields) for issue in page]
+
+        keys = list(keys)
+        batches = [keys[i:i + self.BULK_SIZE] for i in range(0, len(keys), self.BULK_SIZE)]
+        return [issue for batch_issues in self._run_concurrently(search_batch, batches) for issue in batch_issues]
+
+
+    def _create_issues_bulk(self, issues_data):
+        """
+        Creates issues using the /issue/bulk endpoint, chunks are sent concurrently.
+        Issues Jira rejects are reported as warnings with their index in issues_data.
+
+        Returns:
+            list: Key of the created issue for every item of issues_data, None for items not created.
+        """
+        def create_chunk(offset):
+            chunk = issues_data[offset:offset + self.BULK_SIZE]
+            r = self._api_request('post', f"{self.JIRA_REST_URL}/issue/bulk", json={'issueUpdates': chunk})
+            try:
+                data = self._response_json(r)
+            except ValueError:
+                data = {}
+            # when all issues of a chunk are rejected, Jira answers 400 with errors of every issue
+            if not r.ok and not data.get('errors'):
+                self._report_api_failure(r)
+                self._error(f'Creating issues #{offset}-#{offset + len(chunk) - 1} failed.')
+            failed = set()
+            for error in data.get('errors', []):
+                failed.add(error.get('failedElementNumber'))
+                self._warning('Issue #{} NOT created: {}'.format(offset + error.get('failedElementNumber', 0), error.get('elementErrors')))
+            # created issues are listed in the order of the items that did not fail
+            created = iter(issue['key'] for issue in data.get('issues', []))
+            return [None if index in failed else next(created, None) for index in range(len(chunk))]
+
+        offsets = list(range(0, len(issues_data), self.BULK_SIZE))
+        return [key for keys in self._run_concurrently(create_chunk, offsets) for key in keys]
+
+
+    def cmd_clone(self, args):
+        """
+        Clone an issue with some logic for keeping, changing and removing some specific fields.
+
+        With --rows, the original is fetched once and one clone is created for every row,
+        $name placeholders in --set and --re are replaced by the row values.
+        """
+        original = self._get_issue(args.id, None)
+        set_data = json.loads(args.set, strict=False) if args.set else {}
+        re_data = json.loads(args.re) if args.re else {}
+
+        if not args.rows:
+            self._create_issue(self._build_clone_data(original, self._compile_clone_rules(set_data, re_data), args), args)
+            return
 
-        self._create_issue(clon_data, args)
+        clones_data = []
+        for row in self._read_rows(args.rows):
+            rules = self._compile_clone_rules(self._substitute_row(set_data, row), self._substitute_row(re_data, row))
+            clones_data.append(self._build_clone_data(original, rules, args))
+        self._debug_print(f'Creating {len(clones_data)} clones of {args.id}')
+        keys = [key for key in self._create_issues_bulk(clones_data) if key]
+        if not keys:
+            self._error('No clone created.')
+
+        # read created issues back in bulk, so output format can use any field
+        issues = {issue['key']: issue for issue in self._search_issues_by_keys(keys)}
+        created = [issues[key] for key in keys if key in issues]
+        if args.raw:
+            self._print_raw_issues(created)
+        else:
+            self._print_issues(self._get_output_format(args), created)
 
 
     def _get_fake_transitions(self):
@@ -791,7 +3216,7 @@ class EasyJira:
         fake_return = self._get_fake_transitions() if self._program_args.simulate else None
         r = self._api_request('get', f"{self.JIRA_REST_URL}/issue/{issue}/transitions?expand=transitions.fields", fake_return = fake_return)
         if r.ok:
-            return r.json()['transitions']
+            return self._response_json(r)['transitions']
         else:
             self._report_api_failure(r)
             self._error(f'Could not read transitions for issue {issue}.')
@@ -857,6 +3282,152 @@ class EasyJira:
                     self._error(f'Comment not added to the tissue {issue}.')
 
 
+    def _apply_webhook_event(self, payload):
+        """
+        Applies a Jira webhook event (jira:issue_created, jira:issue_updated or jira:issue_deleted)
+        to the local issue store, the status changelog cache and the HTTP cache.
+        Events older than the stored version of the issue are ignored, as webhooks may arrive out of order.
+
+        Returns:
+            bool: Whether the event was applied.
+        """
+        event = payload.get('webhookEvent')
+        issue = payload.get('issue')
+        if event not in ('jira:issue_created', 'jira:issue_updated', 'jira:issue_deleted') or not isinstance(issue, dict) or 'key' not in issue:
+            self._debug_print(f'Ignoring webhook event {event}')
+            return False
+        key = issue['key']
+        store = self._get_issue_store()
+        changelog_path = os.path.join(self._cache_dir, 'changelog', f'{key}.json')
+        self._http_cache.invalidate(f"{self.JIRA_REST_URL}/issue/{key}")
+        with self._webhook_lock:
+            if event == 'jira:issue_deleted':
+                store.delete([key])
+                if os.path.exists(changelog_path):
+                    os.remove(changelog_path)
+                self._debug_print(f'Webhook: {key} deleted')
+                return True
+
+            updated = issue.get('fields', {}).get('updated')
+            stored = store.get(key)
+            stored_updated = stored['fields'].get('updated') if stored else None
+            if updated and stored_updated and self._parse_timestamp(stored_updated) > self._parse_timestamp(updated):
+                self._debug_print(f'Webhook: {key} already stored in a newer version')
+                return False
+            items = (payload.get('changelog') or {}).get('items') or []
+            history = {'created': updated, 'items': items}
+            if stored and 'changelog' in stored and 'changelog' not in issue:
+                # keep the expanded changelog of the stored issue up to date
+                histories = stored['changelog']['histories'] + ([history] if items else [])
+                issue = dict(issue, changelog=dict(stored['changelog'], histories=histories, total=len(histories), maxResults=len(histories)))
+            store.put([issue])
+
+            status_items = [item for item in items if item['field'] == 'status']
+            cached = self._read_cache_file(changelog_path)
+            if cached and updated:
+                # the status changelog cache stays valid for the new updated timestamp
+                histories = cached['histories'] + ([dict(history, items=status_items)] if status_items else [])
+                self._write_cache_file(changelog_path, {'updated': updated, 'histories': histories})
+            self._debug_print(f"Webhook: {key} {event.split('_')[-1]}")
+            return True
+
+
+    def _create_webhook_server(self, host, port, secret=None):
+        """
+        Returns an HTTP server applying webhook events it receives, not started yet.
+        """
+        server = http.server.ThreadingHTTPServer((host, port), WebhookHandler)
+        server.daemon_threads = True
+        server.secret = secret
+        def apply_event(payload):
+            applied = self._apply_webhook_event(payload)
+            self._metrics.inc('easyjira_webhook_events_total', event=payload.get('webhookEvent'), applied=str(applied).lower())
+            return applied
+        server.apply_event = apply_event
+        server.log = self._debug_print
+        return server
+
+
+    def _write_metrics_file(self, path):
+        """
+        Writes metrics in the Prometheus text format, atomically, so a collector never reads a partial file.
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self._metrics.render())
+        os.replace(tmp_path, path)
+
+
+    def _start_progress(self, interval, metrics_file=None):
+        """
+        Starts a thread printing a progress line to stderr (and rewriting the metrics file) every interval seconds.
+
+        Returns:
+            threading.Event: Set it to stop the thread.
+        """
+        stop = threading.Event()
+        def report():
+            while not stop.wait(interval):
+                print(f'progress: {self._metrics.progress_line()}', file=sys.stderr, flush=True)
+                if metrics_file:
+                    self._write_metrics_file(metrics_file)
+        threading.Thread(target=report, daemon=True).start()
+        return stop
+
+
+    def _start_metrics_server(self, host, port):
+        """
+        Serves metrics on http://host:port/metrics from a background thread.
+        """
+        server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        server.metrics = self._metrics
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._debug_print(f'Serving metrics on http://{host}:{server.server_address[1]}/metrics')
+        return server
+
+
+    def cmd_listen(self, args):
+        """
+        Command handler for receiving webhook events until interrupted.
+        """
+        server = self._create_webhook_server(args.host, args.port, args.secret)
+        print(f'Listening for Jira webhooks on http://{args.host}:{server.server_address[1]}/', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+    def cmd_batch(self, args):
+        """
+        Runs commands listed in a file, one command line (without the program name) per line,
+        in one process, so connection pools and caches of every profile are shared by all commands.
+        """
+        failed = []
+        with open(args.file) as f:
+            lines = [line.strip() for line in f]
+        for number, line in enumerate(lines, 1):
+            if not line or line.startswith('#'):
+                continue
+            self._debug_print(f'Batch line {number}: {line}')
+            try:
+                line_args = self._parser.parse_args(shlex.split(line))
+                if line_args.func == self.cmd_batch:
+                    self._error('batch cannot be nested')
+                self._run_command(line_args)
+            except SystemExit as e:
+                if e.code:
+                    failed.append(number)
+                    if not args.keep_going:
+                        break
+            sys.stdout.flush()
+        if failed:
+            self._error('Batch lines failed: ' + ', '.join(str(number) for number in failed))
+
+
     def cmd_access(self, args):
         """
         Checks access to the server by reading a known to exist issue and
@@ -905,6 +3476,9 @@ class EasyJira:
                   {program_name} query --from-url 'https://issues.redhat.com/issues/?jql=project%20%3D%20%22RHEL%20Planning%22%20and%20issueLinkType%20%3D%20clones%20'
                   {program_name} query --jql 'parent = RHELPLAN-138763' --outputformat '{key}'
                   {program_name} --simulate query --jql 'filter=12363088'
+                  {program_name} query --jql 'project = RHELPLAN' --watch rhelplan --watch-interval 300
+                  {program_name} query --jql 'project = RHELPLAN' --group-by assignee_text,status_text --agg 'count,sum(story_points)'
+                  {program_name} query --jql 'project = RHELPLAN AND resolved >= -90d' --cycle-time --group-by components_list --stages-file stages.json
 
               Updating JIRA issues:
                 Consider reading "Updating an Issue via the JIRA REST APIs" section of the Jira API:
@@ -915,6 +3489,7 @@ class EasyJira:
                   {program_name} update -j RHELPLAN-95816 --json '{"update": { "labels": [ {"add": "mynewlabel"} ] } }'
                   {program_name} update -j RHELPLAN-95816 --json '{"update": { "labels": [ {"remove": "mynewlabel"} ] } }'
                   {program_name} update -j RHELPLAN-142727 --json '{"update": {"issuelinks": [{"add": {"outwardIssue": {"key": "RHELPLAN-141789"}, "type": {"inward": "is cloned by", "name": "Cloners", "outward": "clones"}}}]}}'
+                  {program_name} --concurrency 8 --rate-limit 5 update --jsonl_file updates.jsonl --json-summary
 
 
                 Notes:
@@ -926,6 +3501,66 @@ class EasyJira:
                 Examples:
                   {program_name} new --summary 'Test issue for playing around with Jira API' --description 'testing description with a nice text simulating a text for a <bug> or a <feature>.'  --project RHELPLAN
 
+              Exporting many JIRA issues:
+                The query is split into shards by creation time (or key) that are read in parallel,
+                so there is no limit of 1000 issues and no deep pagination.
+
+                Examples:
+                  {program_name} --concurrency 8 export --jql 'project = RHEL' -o rhel.ndjson
+                  # continue the same export after it was interrupted
+                  {program_name} --concurrency 8 export --jql 'project = RHEL' -o rhel.ndjson --resume
+                  {program_name} --compress zstd export --jql 'project = RHEL' -o rhel.ndjson.zst
+
+              Walking links between JIRA issues:
+                Issues are read level by level, following links, subtasks and epic children.
+
+                Examples:
+                  {program_name} graph -j RHELPLAN-141789 --link-types blocks --direction outward --depth 5
+                  {program_name} graph -j RHELPLAN-141789 --output dot | dot -Tsvg > graph.svg
+
+              Rolling up numbers of epics and parents:
+                All issues under the given issues (epic children, subtasks and deeper) are read at once.
+
+                Examples:
+                  {program_name} rollup -j RHELPLAN-138763 RHELPLAN-138764
+
+              Working with several Jira servers:
+                Define named profiles in an INI file, one section per profile with url, token_file, token_env,
+                concurrency, rate_limit and cache_dir keys. Several commands can run in one process using batch.
+
+                Examples:
+                  {program_name} --profile staging query --jql 'project = RHELPLAN'
+                  printf '%s\\n' "--profile staging query --jql 'project = RHELPLAN'" "query --jql 'project = RHELPLAN'" > commands
+                  {program_name} batch commands
+
+              Running several queries at once:
+                Issues matched by more than one query are downloaded only once.
+
+                Examples:
+                  {program_name} query --named-jql 'new=project = RHELPLAN AND status = New' --named-jql 'mine=project = RHELPLAN AND assignee = currentUser()'
+                  {program_name} query --query-file dashboard.queries --output-dir dashboard
+
+              Grouping security trackers by CVE:
+                Example:
+                  {program_name} query --errata --jql 'project = RHEL AND labels = SecurityTracking AND component = openssl'
+
+              Answering simple queries locally:
+                Projects or queries synced into the local store by export --store are used by query --cache
+                for queries like project = X AND status = Y AND labels = Z within them, other queries go to the server.
+
+                Examples:
+                  {program_name} export --store --jql 'project = RHELPLAN' -o rhelplan.ndjson
+                  {program_name} query --cache --jql 'project = RHELPLAN AND status = "In Progress" AND labels = ux'
+
+                To keep the store up to date without polling, register a Jira webhook for issue created, updated and
+                deleted events pointing to a running listen command:
+                  {program_name} listen --host 0.0.0.0 --port 8080 --secret "$WEBHOOK_SECRET"
+
+              Monitoring batch and daemon runs:
+                Examples:
+                  {program_name} --progress 10 --metrics-file easyjira.prom export --jql 'project = RHELPLAN' -o rhelplan.ndjson
+                  {program_name} --metrics-port 9100 listen
+
               Moving to a different status and closing JIRA issues:
                 Closing a JIRA issue is just a move to a different status.
 
@@ -949,6 +3584,9 @@ class EasyJira:
                   # Clone an issue and add a suffix to the summary
                   {program_name} clone  -j RHELPLAN-141789  --re '{"summary": {"pattern": "$", "replacement": " cloned"}}'
 
+                  # Clone one issue linked to an epic for every team listed in a CSV file with a "team" column, in one run
+                  {program_name} clone -j RHELMISC-18238 --rows teams.csv --re '{"summary": {"pattern": "rhel-pt-pcp", "replacement": "$team"}}' --set '{"AssignedTeam": "$team"}'
+
                   # Clone one issue linked to an epic and assign it to a different team
                   cat teams2clone | while read -r team ; do echo $team ; {program_name} clone -j RHELMISC-18238 --re "{\\"summary\\": {\\"pattern\\": \\"rhel-pt-pcp\\", \\"replacement\\": \\"$team\\"}}" --set "{\\"AssignedTeam\\": \\"$team\\"}" ; sleep 3 ; done
             ''')
@@ -961,6 +3599,19 @@ class EasyJira:
         parser.add_argument('--store-api-calls', help='Store what API calls the tool performed and with what input into a given file. The data are appeneded.')
         parser.add_argument('--simulate', action='store_true', help='Do not proceed with any API calls.')
         parser.add_argument('--debug', action='store_true', help='Show very verbose log of what the tool does.')
+        parser.add_argument('--profile', help=f'Use a named profile (server URL, token, limits, cache directory) defined in {self._profiles_path}')
+        parser.add_argument('--concurrency', type=int, help=f'How many API calls may run in parallel where the tool fetches many independent resources (default: concurrency of the profile or {self.DEFAULT_CONCURRENCY})')
+        parser.add_argument('--rate-limit', dest='rate_limit', type=float, help='Maximum number of API calls started per second, shared by all parallel calls (default: rate_limit of the profile or 0, no limit)')
+        parser.add_argument('--retries', type=int, default=self._retries, help=f'How many times to retry API calls rejected with 429, or with 503 when they are not POST requests (default: {self._retries})')
+        parser.add_argument('--http-cache-ttl', dest='http_cache_ttl', type=int, default=60, help='For how many seconds responses of single issues without ETag/Last-Modified are reused without asking the server, responses with them are always revalidated (default: 60, 0 disables reuse)')
+        parser.add_argument('--http-cache-size', dest='http_cache_size', type=int, default=256, help='How many responses of single issues are kept in memory (default: 256)')
+        parser.add_argument('--http-cache-dir', dest='http_cache_dir', help='Keep cached responses also in this directory, so they are reused by later runs')
+        parser.add_argument('--compress', choices=['none', 'gzip', 'zstd'], default='none', help='Compress files written by the tool: export output, checkpoints and cache files; compressed files are read transparently (default: none)')
+        parser.add_argument('--progress', type=float, metavar='SECONDS', help='Print a progress line with request rate, latency, retries, cache hits and issues read to stderr every SECONDS seconds and at the end')
+        parser.add_argument('--metrics-file', dest='metrics_file', help='Write metrics (requests by status, latency histogram, retries, cache lookups) in the Prometheus text format into this file at the end, and with --progress also periodically')
+        parser.add_argument('--metrics-port', dest='metrics_port', type=int, help='Serve metrics in the Prometheus text format on http://HOST:PORT/metrics while running, useful with listen')
+        parser.add_argument('--metrics-host', dest='metrics_host', default='127.0.0.1', help='Address to serve metrics on (default: 127.0.0.1)')
+        parser.add_argument('--json-backend', dest='json_backend', default='auto', choices=['auto', 'orjson', 'ujson', 'json'], help='JSON library used for decoding responses and encoding output (default: auto, the fastest installed one)')
 
         # query command
         parser_query = subparsers.add_parser('query', help='query JIRA issues')
@@ -970,19 +3621,41 @@ class EasyJira:
                             help='Use full URL as an argument')
         parser_query.add_argument('--jql', dest='jql',
                             help='Use JQL query')
+        parser_query.add_argument('--named-jql', dest='named_jql', metavar='NAME=JQL', action='append',
+                            help='Run a named query, can be given several times; queries run concurrently, every distinct issue is downloaded once and the results are printed as NDJSON with the query name in the "query" key (NAME<tab>line with --outputformat)')
+        parser_query.add_argument('--query-file', dest='query_file',
+                            help='Read named queries from a file, one NAME=JQL per line, lines starting with # are ignored')
+        parser_query.add_argument('--output-dir', dest='output_dir',
+                            help='With named queries, write results of every query into NAME.ndjson (NAME.txt with --outputformat) in this directory')
         parser_query.add_argument('--raw', action='store_true',
                             help='Display raw issue data (JSON)')
+        parser_query.add_argument('--ndjson', action='store_true',
+                            help='Display raw issue data as newline-delimited JSON, one compact issue per line')
         parser_query.add_argument('--start_at', dest='start_at', default=0, type=int, help='Pagination, start at which item in the output of a single query')
         parser_query.add_argument('--max_results', dest='max_results', default=self.DEFAULT_MAX_RESULTS, type=int, help='Pagination, how many items in the output of a single query, not counting individually requested IDs')
         parser_query.add_argument('--auto_paginate', dest='auto_paginate', action='store_true', help='Use pagination automatically to read all results and fetch them repeatadly')
+        parser_query.add_argument('--fields', help='Comma separated fields to read, given by ids or names, e.g. summary,Story Points,target_version; fields used by composite fields are always read (default: all navigable fields)')
         parser_query.add_argument('--expand', help='Force expanding some fields, passed without check to REST API (?expand=...), typical values separated by a comma: transitions, changelog')
         parser_query.add_argument('--transitions-changelog', action='store_true', help='Show only transitions changelog as the output')
         parser_query.add_argument('--transitions-stats', action='store_true', help='Show transitions stats on weekly basis and window of 4 weeks')
+        parser_query.add_argument('--watch', metavar='NAME', help='Compare the result of the query with the previous run stored under NAME and print added, changed and removed issues as NDJSON events, only issues updated since the previous run are downloaded')
+        parser_query.add_argument('--watch-interval', dest='watch_interval', type=int, default=0, metavar='SECONDS', help='With --watch, repeat the comparison every SECONDS seconds until interrupted')
+        parser_query.add_argument('--group-by', dest='group_by', metavar='FIELD[,FIELD]', help='Print aggregations per group of issues instead of issues, fields are names used in --outputformat, e.g. status_text, components_list, assignee_text, sprint. Issues with several components, labels or other list values are counted in a group of each value. All matching issues are read, regardless of --max_results.')
+        parser_query.add_argument('--agg', metavar='AGG[,AGG]', help='Aggregations to print, comma separated: count, sum(field), avg(field), min(field), max(field), e.g. count,sum(story_points) (default: count)')
+        parser_query.add_argument('--errata', action='store_true', help='Print security trackers grouped per CVE: errata description, flaw BZs, streams and trackers of all streams, tab separated (or NDJSON with --ndjson); trackers without a CVE label are grouped per flaw BZ. All matching issues are read.')
+        parser_query.add_argument('--cycle-time', dest='cycle_time', action='store_true', help='Show p50/p85/p95 of cycle time and lead time in days, per group given by --group-by. All matching issues are read.')
+        parser_query.add_argument('--time-in-status', dest='time_in_status', action='store_true', help='Show days spent in every status, cycle time and lead time for every issue as NDJSON. All matching issues are read.')
+        parser_query.add_argument('--stages-file', dest='stages_file', help='JSON file mapping statuses to stages used by --transitions-stats, --cycle-time and --time-in-status, either {"In Progress": "triaged", ...} or {"statuses": {...}, "stage_order": [...], "cycle_start": "triaged"}; the last stage of stage_order means done')
+        parser_query.add_argument('--changelog-endpoint', dest='changelog_endpoint', action='store_true', help='Read status history of each issue from the paginated /issue/<key>/changelog endpoint (concurrently and cached per issue) instead of expanding the whole changelog in search results')
+        parser_query.add_argument('--cache', action='store_true', help='Answer the query from the local issue store when all its issues were synced by export --store (of the same query or of whole projects selected by it) and the JQL is simple enough: clauses joined by AND on project, status, assignee, labels, component, parent, key, "Epic Link", created and updated (dates in UTC), using =, !=, in, not in (and <, <=, >, >= for dates), ORDER BY those fields; other queries are sent to the server')
+        parser_query.add_argument('--cache-max-age', dest='cache_max_age', type=int, default=86400, help='With --cache, ask the server when the issues were synced into the local store (by export --store) more than this many seconds ago (default: 86400, 0 for no limit)')
+        parser_query.add_argument('--store', action='store_true', help='Save issues read from the server into the local issue store')
+        parser_query.add_argument('--workers', type=int, default=0, help='Compute composite fields, render output and extract transitions in this many processes, pages are processed in parallel and printed in order; helps with large results on multi-core hosts (default: 0, no extra processes)')
         parser_query.add_argument('--status_as_of_date', dest='status_as_of_date', default='now', help='Add an extra field status_as_of_date that will include status for the date given as an argument (format YYYY-MM-DD), default: now')
 
         # the idea here is to use something like print("format from user".format(**issue)) but needs to be validated by some real pythonist for security
         parser_query.add_argument('--outputformat', dest='output_format',
-                            help='Print output in the form given. Use str.format string with {key} or {fields[duedate]} syntax. Use --raw to see what keys exist.')
+                            help='Print output in the form given. Use str.format string with {key} or {fields[duedate]} syntax, fields can be given also by names, e.g. {fields[Story Points]}. Use --raw to see what keys exist.')
         parser_query.set_defaults(func=self.cmd_query)
 
         # new command
@@ -1012,6 +3685,9 @@ class EasyJira:
                                    help='JSON that defines what should be changed. See "Updating an Issue via the JIRA REST APIs" section of the Jira API: https://developer.atlassian.com/server/jira/platform/updating-an-issue-via-the-jira-rest-apis-6848604/')
         parser_update.add_argument('--json_file',
                                 help='Input raw issue data from a JSON file')
+        parser_update.add_argument('--jsonl_file',
+                                help='Update issues with per-issue data from a JSONL file, one JSON object with "key" and the update data per line, e.g. {"key": "RHELPLAN-95816", "fields": {"summary": "new"}}')
+        parser_update.add_argument('--json-summary', dest='json_summary', action='store_true', help='Print a JSON summary of updated and failed issues instead of a line per issue')
         parser_update.add_argument('--comment', help='Longer comment to be added to the issue')
         parser_update.add_argument('--comment_file', help='Longer comment to be added to issue located in a file')
         parser_update.add_argument('--link-type', choices=self.link_data.keys(), help='What type of link to use')
@@ -1035,6 +3711,8 @@ class EasyJira:
                             help='Display raw issue data (JSON)')
         parser_clone.add_argument('--outputformat', dest='output_format',
                             help='Print output in the form given. Use str.format string with {key} or {fields[duedate]} syntax. Use --json to see what keys exist.')
+        parser_clone.add_argument('--rows', metavar='file', type=str,
+                                   help='CSV (with a header) or JSONL file with one row of variables per clone. The original is fetched once and one clone is created for every row, $name in --set and --re values is replaced by the value of the row\'s column name.')
         parser_clone.add_argument('--copy_fields', metavar='field', type=str, nargs='+',
                                   help='Fields to be copied from the original issue, can be specified multiple times. If combined with --re, regular expression replacement will be applied for those fields.')
 
@@ -1049,6 +3727,37 @@ class EasyJira:
         parser_move.add_argument('--status', default='Closed', help='Target status (default: Closed)')
         parser_move.add_argument('--resolution', default='Done', help='Resolution of the closure (default: Done)')
 
+        # export command
+        parser_export = subparsers.add_parser('export', help='export all issues matching a query into a NDJSON file')
+        parser_export.set_defaults(func=self.cmd_export)
+        parser_export.add_argument('--from-url', dest='from_url', help='Use full URL as an argument')
+        parser_export.add_argument('--jql', dest='jql', help='Use JQL query')
+        parser_export.add_argument('-o', '--output', required = True, help='File to write issues to, one JSON issue per line')
+        parser_export.add_argument('--shard-by', dest='shard_by', choices=['created', 'key'], default='created', help='Field used to split the query into shards read in parallel, key works for a single project only (default: created)')
+        parser_export.add_argument('--shard-size', dest='shard_size', type=int, default=self.SEARCH_PAGE_SIZE, help=f'Shards are split until they match at most this number of issues (default: {self.SEARCH_PAGE_SIZE})')
+        parser_export.add_argument('--expand', help='Force expanding some fields, passed without check to REST API (?expand=...), typical values separated by a comma: transitions, changelog')
+        parser_export.add_argument('--fields', help='Comma separated fields to export, given by ids or names, e.g. summary,Story Points (default: all navigable fields)')
+        parser_export.add_argument('--store', action='store_true', help='Save exported issues also into the local issue store used by query --cache')
+        parser_export.add_argument('--resume', action='store_true', help='Continue an interrupted export of the same query into the same output, using the checkpoint file stored next to the output')
+
+        # graph command
+        parser_graph = subparsers.add_parser('graph', help='show issues transitively linked to given issues')
+        parser_graph.set_defaults(func=self.cmd_graph)
+        parser_graph.add_argument('-j', '--id', '--jira_id', metavar='ID', type=str, nargs='+', required = True,
+                                  help='Jira issues ID to start from')
+        parser_graph.add_argument('--depth', type=int, default=3, help='How many links far from the given issues to go (default: 3)')
+        parser_graph.add_argument('--link-types', dest='link_types', help='Comma separated link types to follow, either ' + ', '.join(self.link_data.keys()) + ' or any Jira link type name (default: all)')
+        parser_graph.add_argument('--direction', choices=['outward', 'inward', 'both'], default='both', help='Follow links in outward (e.g. blocks), inward (e.g. is blocked by) or both directions (default: both)')
+        parser_graph.add_argument('--follow', default='links,subtasks,epics', help='Comma separated relations to follow: links, subtasks, epics (default: links,subtasks,epics)')
+        parser_graph.add_argument('--output', choices=['edges', 'dot', 'json'], default='edges', help='Output format, edges prints tab separated from, relation, to (default: edges)')
+
+        # rollup command
+        parser_rollup = subparsers.add_parser('rollup', help='show story points, statuses and completion rolled up from all issues under epics or parents')
+        parser_rollup.set_defaults(func=self.cmd_rollup)
+        parser_rollup.add_argument('-j', '--id', '--jira_id', metavar='ID', type=str, nargs='+', required = True,
+                                   help='Jira epic or parent issues ID')
+        parser_rollup.add_argument('--output', choices=['tsv', 'json'], default='tsv', help='Output format (default: tsv)')
+
         # fields-mapping command
         parser_fields_mapping = subparsers.add_parser('fields-mapping', help='show fields mapping for a project and issue type (shows only fields available when creating a new issue) or specific issue (shows all fields)')
         parser_fields_mapping.set_defaults(func=self.cmd_fields_mapping)
@@ -1056,6 +3765,20 @@ class EasyJira:
         parser_fields_mapping.add_argument('-j', '--id', '--jira_id', metavar='ID', type=str, help='Jira issue ID')
         parser_fields_mapping.add_argument('--issue_type', default='Bug', help='Which issue type do we want to see fields for (default Bug)')
         parser_fields_mapping.add_argument('--only_required', action='store_true', help='Print only required fields')
+        parser_fields_mapping.add_argument('--catalog', action='store_true', help='Print names and slugs of all fields known to the server mapped to field ids, any of them can be used in --outputformat and --fields')
+
+        # listen command
+        parser_listen = subparsers.add_parser('listen', help='receive Jira webhooks and keep the local issue store up to date')
+        parser_listen.set_defaults(func=self.cmd_listen)
+        parser_listen.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+        parser_listen.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+        parser_listen.add_argument('--secret', help='Accept only requests with this value in the secret query parameter, configure the webhook URL as http://host:port/?secret=...')
+
+        # batch command
+        parser_batch = subparsers.add_parser('batch', help='run commands listed in a file in one process')
+        parser_batch.set_defaults(func=self.cmd_batch)
+        parser_batch.add_argument('file', help='File with one command per line, written as arguments of this tool (global options like --profile included), lines starting with # are ignored')
+        parser_batch.add_argument('--keep-going', dest='keep_going', action='store_true', help='Continue with next lines when a command fails')
 
         # access command
         parser_access = subparsers.add_parser('access', help='verifies that the tool is able to access the server')
@@ -1066,12 +3789,57 @@ class EasyJira:
             sys.argv.append('--help')
 
         args = parser.parse_args(args=fake_args) if fake_args else parser.parse_args()
+        self._parser = parser
+        if args.metrics_port is not None:
+            self._start_metrics_server(args.metrics_host, args.metrics_port)
+        stop_progress = self._start_progress(args.progress, args.metrics_file) if args.progress else None
+        try:
+            self._run_command(args)
+        finally:
+            if stop_progress:
+                stop_progress.set()
+                print(f'progress: {self._metrics.progress_line()}', file=sys.stderr)
+            if args.metrics_file:
+                self._write_metrics_file(args.metrics_file)
+
+        if self._debug and resource:
+            # ru_maxrss is in kilobytes on Linux
+            self._debug_print('Peak memory usage: {:.1f} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+        return 0
+
+
+    def _run_command(self, args):
+        """
+        Applies global arguments and runs the command handler.
+        """
         self._program_args = args
         self._debug = args.debug
+        self._retries = args.retries
+        self._compress = None if args.compress == 'none' else args.compress
+        if self._compress == 'zstd' and not zstandard:
+            self._error('zstd compression requires python zstandard module.')
+        self._select_json_backend(args.json_backend)
+        self._activate_profile(args.profile, args)
 
         args.func(args)
 
-        return 0
+
+# the EasyJira instance of a worker process used by --workers
+_page_worker = None
+
+
+def _init_page_worker(settings):
+    global _page_worker
+    _page_worker = EasyJira()
+    _page_worker.STORY_POINTS_FIELD = settings['story_points_field']
+    _page_worker.AUTO_CUSTOM_FIELDS = settings['auto_custom_fields']
+    _page_worker._auto_custom_field_slugs = {key: _page_worker._field_slug(name) for key, name in settings['auto_custom_fields'].items()}
+    _page_worker._program_args = argparse.Namespace(status_as_of_date=settings['status_as_of_date'])
+    _page_worker._json_backend = settings['json_backend']
+
+
+def _process_page(mode, output_format, page):
+    return _page_worker._process_page(mode, output_format, page)
 
 
 if __name__ == '__main__':
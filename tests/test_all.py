@@ -5,6 +5,13 @@ import sys
 import pytest
 import json
 import shlex
+import re
+import argparse
+import sqlite3
+import threading
+import time
+import urllib.request
+import urllib.error
 from unittest.mock import patch
 
 currentdir = os.path.dirname(os.path.realpath(__file__))
@@ -49,6 +56,40 @@ def _parse_doc_file(filename):
     return output
 
 
+def _sample_issue(key='RHELPLAN-1', status='New', labels=None, **fields):
+    issue_fields = {'summary': f'Summary of {key}', 'labels': labels or [], 'status': {'name': status},
+                    'assignee': {'name': 'jdoe'}, 'components': [{'name': 'comp'}],
+                    'created': '2023-01-02T10:00:00.000+0000', 'updated': '2023-02-02T10:00:00.000+0000',
+                    'customfield_12310243': 3.0}
+    issue_fields.update(fields)
+    return {'id': '1', 'key': key, 'fields': issue_fields}
+
+
+def _sharded_search(server, fail_at=None):
+    """
+    Returns fake _count_issues and _iter_search_pages answering key shard queries from a list of issues,
+    searching a shard with an issue listed in fail_at raises ConnectionError.
+    """
+    def matching(jql):
+        match = re.search(r'key >= "RHEL-(\d+)" AND key < "RHEL-(\d+)"', jql)
+        return [i for i in server if not match or int(match.group(1)) <= int(i['key'].split('-')[1]) < int(match.group(2))]
+    def fake_pages(jql, max_results=None, start_at=0, expand=None, fields=None):
+        issues = sorted(matching(jql), key=lambda i: int(i['key'].split('-')[1]), reverse='DESC' in jql)
+        if fail_at and 'key >=' in jql and fail_at[0] in [i['key'] for i in issues]:
+            raise ConnectionError('network blip')
+        yield issues[:max_results] if max_results else issues
+    return (lambda jql: len(matching(jql))), fake_pages
+
+
+def _easyjira_for_unit_test(**args):
+    rj = easyjira.EasyJira()
+    program_args = {'store_api_calls': None, 'show_api_calls': False, 'simulate': True}
+    program_args.update(args)
+    rj._program_args = argparse.Namespace(**program_args)
+    rj._token = 'fake-token'
+    return rj
+
+
 def test_help(capsys):
     rj = easyjira.EasyJira()
     with pytest.raises(SystemExit):
@@ -99,6 +140,758 @@ def test_doc_query(capsys):
     #assert 'params = None' in captured.err
 
 
+def test_json_backends(capsys):
+    rj = _easyjira_for_unit_test()
+    for backend in ['json', 'auto']:
+        rj._select_json_backend(backend)
+        data = {'key': 'RHELPLAN-1', 'fields': {'summary': 'a/b \u00e9'}}
+        assert rj._json_loads(rj._json_dumps(data)) == data
+        assert rj._json_loads(rj._json_dumps(data).encode('utf-8')) == data
+        assert rj._json_dumps(data, pretty=True) == json.dumps(data, sort_keys=True, indent=4)
+        assert '\n' not in rj._json_dumps(data)
+
+
+def test_ndjson_output(capsys):
+    rj = _easyjira_for_unit_test()
+    rj._print_ndjson_issues([_sample_issue('RHELPLAN-1'), _sample_issue('RHELPLAN-2')])
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)['key'] for line in lines] == ['RHELPLAN-1', 'RHELPLAN-2']
+    assert json.loads(lines[0])['fields']['status_text'] == 'New'
+
+
+def test_status_changelog_pagination_and_cache(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._cache_dir = str(tmp_path)
+    rj.CHANGELOG_PAGE_SIZE = 1
+    pages = [
+        {'startAt': 0, 'total': 2, 'isLast': False, 'values': [
+            {'created': '2023-01-03T10:00:00.000+0000', 'items': [{'field': 'status', 'fromString': 'New', 'toString': 'In Progress'}]}]},
+        {'startAt': 1, 'total': 2, 'isLast': True, 'values': [
+            {'created': '2023-01-04T10:00:00.000+0000', 'items': [{'field': 'labels', 'fromString': '', 'toString': 'x'}]}]},
+    ]
+    calls = []
+    def fake_request(method, url, params=None, json=None, fake_return=None):
+        calls.append(params)
+        return easyjira.FakeResponse(pages[len(calls) - 1])
+    issue = _sample_issue('RHELPLAN-1')
+    with patch.object(rj, '_api_request', side_effect=fake_request):
+        rj._attach_status_changelogs([issue])
+        # the second call is answered from the cache as 'updated' did not change
+        assert rj._get_status_changelog('RHELPLAN-1', issue['fields']['updated']) == issue['changelog']['histories']
+    assert calls == ['startAt=0&maxResults=1', 'startAt=1&maxResults=1']
+    assert rj._get_transitions_changelog([issue]) == [{'key': 'RHELPLAN-1', 'from': 'New', 'to': 'In Progress', 'timestamp': '2023-01-03T10:00:00.000+0000', 'points': 3.0}]
+
+
+def test_clone_rows(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rows_file = tmp_path / 'teams.csv'
+    rows_file.write_text('team\nrhel-pt-a\nrhel-pt-b\n')
+    original = _sample_issue('RHELMISC-1', summary='Task for rhel-pt-pcp', description='desc',
+                             project={'key': 'RHELMISC'}, issuetype={'name': 'Task'}, duedate=None, priority=None,
+                             customfield_12311140='RHELMISC-2')
+    args = argparse.Namespace(copy_fields=None, no_link_back=False)
+    re_data = {'summary': {'pattern': 'rhel-pt-pcp', 'replacement': '$team'}}
+    summaries = []
+    for row in rj._read_rows(str(rows_file)):
+        rules = rj._compile_clone_rules({}, rj._substitute_row(re_data, row))
+        clone = rj._build_clone_data(original, rules, args)
+        summaries.append(clone['fields']['summary'])
+        assert clone['update']['issuelinks'][0]['add']['outwardIssue']['key'] == 'RHELMISC-1'
+    assert summaries == ['Task for rhel-pt-a', 'Task for rhel-pt-b']
+    assert list(rj._regex_cache) == ['rhel-pt-pcp']
+
+
+def test_bulk_update_payloads(capsys, tmp_path):
+    rj = _easyjira_for_unit_test()
+    jsonl_file = tmp_path / 'updates.jsonl'
+    jsonl_file.write_text('{"key": "RHELPLAN-3", "fields": {"summary": "new"}}\n')
+    sent = {}
+    def fake_request(method, url, params=None, json=None, fake_return=None):
+        key = url.rsplit('/', 1)[1]
+        sent[key] = json
+        return argparse.Namespace(ok=key != 'RHELPLAN-2', status_code=400, reason='Bad Request', text='{}')
+    args = argparse.Namespace(json='{"update": {"labels": [{"add": "x"}]}}', json_file=None, jsonl_file=str(jsonl_file),
+                              id=['RHELPLAN-1', 'RHELPLAN-2'], link_type='blocks', link_issue='RHELPLAN-9', json_summary=True)
+    with patch.object(rj, '_api_request', side_effect=fake_request):
+        with pytest.raises(SystemExit):
+            rj.cmd_update(args)
+    assert len(sent['RHELPLAN-1']['update']['issuelinks']) == 1
+    assert len(sent['RHELPLAN-2']['update']['issuelinks']) == 1
+    assert sent['RHELPLAN-3']['fields'] == {'summary': 'new'}
+    summary = json.loads(capsys.readouterr().out)
+    assert sorted(summary['updated']) == ['RHELPLAN-1', 'RHELPLAN-3']
+    assert [failure['key'] for failure in summary['failed']] == ['RHELPLAN-2']
+    # a line without key is reported with its number
+    jsonl_file.write_text('{"key": "RHELPLAN-3", "fields": {}}\n{"fields": {"summary": "new"}}\n')
+    with pytest.raises(SystemExit):
+        rj.cmd_update(args)
+    assert capsys.readouterr().out == f'ERROR: Line 2 of {jsonl_file} has no "key" of the issue to update.\n'
+
+
+def test_rate_limiter():
+    limiter = easyjira.RateLimiter(100)
+    start = easyjira.time.monotonic()
+    for i in range(5):
+        limiter.wait()
+    assert easyjira.time.monotonic() - start >= 0.04
+
+
+def test_watch_query_events(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._cache_dir = str(tmp_path)
+    server = {'RHELPLAN-1': _sample_issue('RHELPLAN-1'), 'RHELPLAN-2': _sample_issue('RHELPLAN-2')}
+    searches = []
+    def fake_pages(jql, max_results=None, start_at=0, expand=None, fields=None):
+        searches.append((jql, fields))
+        if 'updated >=' in jql:
+            issues = [issue for issue in server.values() if issue['fields']['updated'] >= '2023-03-01']
+        else:
+            issues = list(server.values())
+        yield [{'key': issue['key']} for issue in issues] if fields == ['key'] else issues
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        events = rj._watch_query('q', 'project = RHELPLAN ORDER BY key')
+        assert [(e['event'], e['key']) for e in events] == [('added', 'RHELPLAN-1'), ('added', 'RHELPLAN-2')]
+        del server['RHELPLAN-2']
+        server['RHELPLAN-1']['fields']['updated'] = '2023-03-05T10:00:00.000+0000'
+        events = rj._watch_query('q', 'project = RHELPLAN ORDER BY key')
+    assert [(e['event'], e['key']) for e in events] == [('changed', 'RHELPLAN-1'), ('removed', 'RHELPLAN-2')]
+    assert searches[1] == ('(project = RHELPLAN) AND updated >= "2023/02/01 10:00"', None)
+    assert searches[2] == ('project = RHELPLAN', ['key'])
+    # snapshot without timestamps reads all issues again
+    rj._write_cache_file(str(tmp_path / 'snapshots' / 'q.json'), {'jql': 'project = RHELPLAN ORDER BY key', 'issues': {'RHELPLAN-1': None}})
+    server['RHELPLAN-3'] = _sample_issue('RHELPLAN-3', updated='2023-01-01T10:00:00.000+0000')
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        events = rj._watch_query('q', 'project = RHELPLAN ORDER BY key', expand='changelog')
+        assert [(e['event'], e['key']) for e in events] == [('changed', 'RHELPLAN-1'), ('added', 'RHELPLAN-3')]
+        # issues newly matching the query are read with the same expand
+        server['RHELPLAN-4'] = _sample_issue('RHELPLAN-4', updated='2023-01-01T10:00:00.000+0000')
+        with patch.object(rj, '_search_issues_by_keys', return_value=[server['RHELPLAN-4']]) as by_keys:
+            events = rj._watch_query('q', 'project = RHELPLAN ORDER BY key', expand='changelog')
+    assert [(e['event'], e['key']) for e in events] == [('added', 'RHELPLAN-4')]
+    by_keys.assert_called_once_with(['RHELPLAN-4'], expand='changelog')
+
+
+def test_aggregation(capsys):
+    rj = _easyjira_for_unit_test()
+    issues = [_sample_issue('RHELPLAN-1', 'New', customfield_12310243=2.0),
+              _sample_issue('RHELPLAN-2', 'New', customfield_12310243=None),
+              _sample_issue('RHELPLAN-3', 'Closed', customfield_12310243=5.0)]
+    requested_fields = []
+    def fake_pages(jql, max_results=None, start_at=0, expand=None, fields=None):
+        requested_fields.extend(fields)
+        yield issues
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        rj._print_aggregation('project = RHELPLAN', 'status_text', 'count,sum(story_points),avg(story_points)')
+    assert capsys.readouterr().out.splitlines() == ['status_text\tcount\tsum(story_points)\tavg(story_points)',
+                                                    'Closed\t1\t5.0\t5.0',
+                                                    'New\t2\t2.0\t2.0']
+    assert 'customfield_12310243' in requested_fields and 'description' not in requested_fields
+    with patch.object(rj, '_api_request', return_value=easyjira.FakeResponse({'total': 42, 'issues': []})) as request:
+        rj._print_aggregation('project = RHELPLAN', None, 'count')
+    assert 'maxResults=0' in request.call_args.kwargs['params']
+    assert capsys.readouterr().out.splitlines() == ['count', '42']
+    # a failed count search is an error, not a KeyError
+    with patch.object(rj, '_api_request', return_value=argparse.Namespace(ok=False, reason='Bad Request', text='')):
+        with pytest.raises(SystemExit):
+            rj._print_aggregation('project = RHELPLAN', None, 'count')
+    capsys.readouterr()
+    # non-numeric values are skipped with a warning
+    issues = [_sample_issue('RHELPLAN-1', 'New', customfield_12310243={'value': 'big'}), _sample_issue('RHELPLAN-2', 'New', customfield_12310243='3')]
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        rj._print_aggregation('project = RHELPLAN', 'status_text', 'sum(story_points)')
+    assert capsys.readouterr().out.splitlines() == ["WARNING: Field story_points has non-numeric values (e.g. {'value': 'big'} in RHELPLAN-1), they are ignored by sum(story_points).",
+                                                        'status_text\tsum(story_points)', 'New\t3.0']
+    # issues with several labels count toward each of them
+    issues = [_sample_issue('RHELPLAN-1', labels=['x', 'y']), _sample_issue('RHELPLAN-2', labels=['x'])]
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        rj._print_aggregation('project = RHELPLAN', 'labels_list', 'count,sum(story_points)')
+    assert capsys.readouterr().out.splitlines() == ['labels_list\tcount\tsum(story_points)', 'x\t2\t6.0', 'y\t1\t3.0']
+    # status as of a date uses changelogs of the paginated endpoint, also when the search has an inline one
+    rj = _easyjira_for_unit_test(status_as_of_date='2023-01-30')
+    history = [{'created': '2023-01-20T10:00:00.000+0000', 'items': [{'field': 'status', 'fromString': 'New', 'toString': 'In Progress'}]}]
+    issues = [_sample_issue('RHELPLAN-1', 'In Progress'), dict(_sample_issue('RHELPLAN-2', 'In Progress'), changelog={'histories': []})]
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages), patch.object(rj, '_get_status_changelog', return_value=history):
+        rj._print_aggregation('project = RHELPLAN', 'status_as_of_date', 'count', changelog_endpoint=True)
+    assert capsys.readouterr().out.splitlines() == ['status_as_of_date\tcount', 'In Progress\t2']
+
+
+def _issue_with_history(key, component, transitions, **fields):
+    histories = []
+    from_status = 'New'
+    for timestamp, to_status in transitions:
+        histories.append({'created': timestamp, 'items': [{'field': 'status', 'fromString': from_status, 'toString': to_status}]})
+        from_status = to_status
+    issue = _sample_issue(key, from_status, components=[{'name': component}], **fields)
+    issue['changelog'] = {'histories': histories}
+    return issue
+
+
+def test_cycle_time(capsys, tmp_path):
+    rj = _easyjira_for_unit_test()
+    stages_file = tmp_path / 'stages.json'
+    stages_file.write_text(json.dumps({'statuses': {'New': 'new', 'In Progress': 'dev', 'Closed': 'done'}, 'stage_order': ['new', 'dev', 'done'], 'cycle_start': 'dev'}))
+    rj._load_stages_file(str(stages_file))
+    # created on 2023-01-02, started a day later, closed 2 days after start
+    issue = _issue_with_history('RHELPLAN-1', 'a', [('2023-01-03T10:00:00.000+0000', 'In Progress'), ('2023-01-05T10:00:00.000+0000', 'Closed')])
+    timing = rj._get_issue_timing(issue)
+    assert timing == {'key': 'RHELPLAN-1', 'time_in_status': {'New': 1.0, 'In Progress': 2.0}, 'cycle_time': 2.0, 'lead_time': 3.0}
+    pages = [[issue,
+              _issue_with_history('RHELPLAN-2', 'a', [('2023-01-02T10:00:00.000+0000', 'In Progress'), ('2023-01-12T10:00:00.000+0000', 'Closed')]),
+              _issue_with_history('RHELPLAN-3', 'b', [('2023-01-03T10:00:00.000+0000', 'Unknown status')])]]
+    rj._print_cycle_time(pages, ['components_list'])
+    out = capsys.readouterr().out.splitlines()
+    assert out[-3:] == ['components_list\tdone\tcycle_p50\tcycle_p85\tcycle_p95\tlead_p50\tlead_p85\tlead_p95',
+                        'a\t2\t2.0\t10.0\t10.0\t3.0\t10.0\t10.0',
+                        'b\t0\t\t\t\t\t\t']
+    # an issue with two components counts toward each of them
+    both = _issue_with_history('RHELPLAN-4', 'a', [('2023-01-03T10:00:00.000+0000', 'In Progress'), ('2023-01-07T10:00:00.000+0000', 'Closed')])
+    both['fields']['components'] = [{'name': 'a'}, {'name': 'b'}]
+    pages[0].append(both)
+    rj._print_cycle_time(pages, ['components_list'])
+    assert capsys.readouterr().out.splitlines()[-2:] == ['a\t3\t4.0\t10.0\t10.0\t5.0\t10.0\t10.0',
+                                                         'b\t1\t4.0\t4.0\t4.0\t5.0\t5.0\t5.0']
+
+
+def test_issue_graph(capsys):
+    rj = _easyjira_for_unit_test()
+    blocks = {'name': 'Blocks', 'inward': 'is blocked by', 'outward': 'blocks'}
+    server = {
+        'RHELPLAN-1': _sample_issue('RHELPLAN-1', issuelinks=[{'type': blocks, 'outwardIssue': {'key': 'RHELPLAN-2'}}]),
+        'RHELPLAN-2': _sample_issue('RHELPLAN-2', issuelinks=[{'type': blocks, 'inwardIssue': {'key': 'RHELPLAN-1'}},
+                                                             {'type': blocks, 'outwardIssue': {'key': 'RHELPLAN-3'}}]),
+        'RHELPLAN-3': _sample_issue('RHELPLAN-3', issuelinks=[{'type': blocks, 'inwardIssue': {'key': 'RHELPLAN-2'}}],
+                                    subtasks=[{'key': 'RHELPLAN-4'}]),
+        'RHELPLAN-4': _sample_issue('RHELPLAN-4', parent={'key': 'RHELPLAN-3'}),
+        'RHELPLAN-5': _sample_issue('RHELPLAN-5', customfield_12311140='RHELPLAN-1'),
+    }
+    searched = []
+    def fake_search(keys, fields=None, expand=None, jql_field='key'):
+        searched.append((jql_field, sorted(keys)))
+        if jql_field == 'key':
+            return [server[key] for key in keys]
+        return [issue for issue in server.values() if issue['fields'].get('customfield_12311140') in keys]
+    with patch.object(rj, '_search_issues_by_keys', side_effect=fake_search):
+        issues, edges = rj._walk_issue_graph(['RHELPLAN-1'], 2)
+    assert edges == [('RHELPLAN-1', 'blocks', 'RHELPLAN-2'), ('RHELPLAN-1', 'has epic child', 'RHELPLAN-5'), ('RHELPLAN-2', 'blocks', 'RHELPLAN-3')]
+    # every issue is fetched once, RHELPLAN-5 was found by the epic search already
+    fetched = [key for jql_field, keys in searched if jql_field == 'key' for key in keys]
+    assert sorted(fetched) == ['RHELPLAN-1', 'RHELPLAN-2', 'RHELPLAN-3']
+    rj._print_issue_graph(issues, edges, 'dot')
+    assert '"RHELPLAN-1" -> "RHELPLAN-2" [label="blocks"];' in capsys.readouterr().out
+    # links of epic children are one level further than the children
+    server['RHELPLAN-5']['fields']['issuelinks'] = [{'type': blocks, 'outwardIssue': {'key': 'RHELPLAN-6'}}]
+    server['RHELPLAN-6'] = _sample_issue('RHELPLAN-6')
+    with patch.object(rj, '_search_issues_by_keys', side_effect=fake_search):
+        issues, edges = rj._walk_issue_graph(['RHELPLAN-1'], 1, follow=['links', 'epics'])
+        assert sorted(issues) == ['RHELPLAN-1', 'RHELPLAN-2', 'RHELPLAN-5']
+        assert edges == [('RHELPLAN-1', 'blocks', 'RHELPLAN-2'), ('RHELPLAN-1', 'has epic child', 'RHELPLAN-5')]
+        issues, edges = rj._walk_issue_graph(['RHELPLAN-1'], 2, follow=['links', 'epics'])
+    assert ('RHELPLAN-5', 'blocks', 'RHELPLAN-6') in edges and 'RHELPLAN-6' in issues
+
+
+def test_rollup(capsys):
+    rj = _easyjira_for_unit_test()
+    done = {'name': 'Closed', 'statusCategory': {'key': 'done'}}
+    server = [
+        _sample_issue('RHELPLAN-1', summary='Epic'),
+        _sample_issue('RHELPLAN-2', customfield_12311140='RHELPLAN-1', customfield_12310243=3.0),
+        _sample_issue('RHELPLAN-3', customfield_12311140='RHELPLAN-1', customfield_12310243=5.0),
+        _sample_issue('RHELPLAN-4', parent={'key': 'RHELPLAN-3'}, customfield_12310243=2.0),
+    ]
+    server[1]['fields']['status'] = server[3]['fields']['status'] = done
+    searches = []
+    def fake_search(keys, fields=None, expand=None, jql_field='key'):
+        searches.append(jql_field)
+        if jql_field == 'key':
+            return [issue for issue in server if issue['key'] in keys]
+        return [issue for issue in server if issue['fields'].get('customfield_12311140') in keys or (issue['fields'].get('parent') or {}).get('key') in keys]
+    with patch.object(rj, '_search_issues_by_keys', side_effect=fake_search):
+        rj.cmd_rollup(argparse.Namespace(id=['RHELPLAN-1'], output='tsv'))
+    assert searches == ['key', ('parent', 'cf[12311140]'), ('parent', 'cf[12311140]'), ('parent', 'cf[12311140]')]
+    assert capsys.readouterr().out.splitlines()[1] == 'RHELPLAN-1\t3\t2\t10.0\t5.0\t50.0\tClosed:2 New:1\tEpic'
+
+
+def test_sharded_export(tmp_path):
+    rj = _easyjira_for_unit_test()
+    count_issues, fake_pages = _sharded_search([_sample_issue(f'RHEL-{n}') for n in range(1, 26)])
+    output = tmp_path / 'export.ndjson'
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages), \
+         patch.object(rj, '_count_issues', side_effect=count_issues):
+        shards = rj._plan_shards('project = RHEL', 'key', 10)
+        assert rj._export_issues('project = RHEL ORDER BY created', str(output), 'key', 10) == 25
+    assert len(shards) == 4
+    assert shards[0] == '(project = RHEL) AND key >= "RHEL-1" AND key < "RHEL-7"'
+    assert [json.loads(line)['key'] for line in output.read_text().splitlines()] == [f'RHEL-{n}' for n in range(1, 26)]
+    # with one worker, at most two shards are fetched ahead of the one being written
+    rj._concurrency = 1
+    fetched = []
+    written = []
+    store = argparse.Namespace(put=lambda issues: written.append(len(fetched)))
+    def counting_pages(jql, max_results=None, start_at=0, expand=None, fields=None):
+        if 'AND key >=' in jql:
+            fetched.append(jql)
+        yield from fake_pages(jql, max_results, start_at, expand, fields)
+    with patch.object(rj, '_iter_search_pages', side_effect=counting_pages), \
+         patch.object(rj, '_count_issues', side_effect=count_issues):
+        rj._export_issues('project = RHEL', str(output), 'key', 10, store=store)
+    assert len(fetched) == 4 and written[0] <= 2
+
+
+def test_export_resume(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._concurrency = 1
+    fail_at = ['RHEL-13']
+    count_issues, fake_pages = _sharded_search([_sample_issue(f'RHEL-{n}') for n in range(1, 26)], fail_at)
+    output = tmp_path / 'export.ndjson'
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages), \
+         patch.object(rj, '_count_issues', side_effect=count_issues):
+        with pytest.raises(ConnectionError):
+            rj._export_issues('project = RHEL', str(output), 'key', 10)
+        checkpoint = json.loads((tmp_path / 'export.ndjson.checkpoint').read_text())
+        assert checkpoint['completed'] == 2
+        # simulate a partially written shard after the checkpoint
+        with open(output, 'a') as f:
+            f.write('{"key": "RHEL-13", "fiel')
+        fail_at.clear()
+        assert rj._export_issues('project = RHEL', str(output), 'key', 10, resume=True) == 25
+    assert [json.loads(line)['key'] for line in output.read_text().splitlines()] == [f'RHEL-{n}' for n in range(1, 26)]
+    assert not (tmp_path / 'export.ndjson.checkpoint').exists()
+    # the output removed after an interruption cannot be resumed
+    fail_at.append('RHEL-13')
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages), patch.object(rj, '_count_issues', side_effect=count_issues):
+        with pytest.raises(ConnectionError):
+            rj._export_issues('project = RHEL', str(output), 'key', 10)
+        # records of the resumed export must be compressed and shaped the same way
+        rj._compress = 'gzip'
+        with pytest.raises(SystemExit):
+            rj._export_issues('project = RHEL', str(output), 'key', 10, resume=True)
+        rj._compress = None
+        with pytest.raises(SystemExit):
+            rj._export_issues('project = RHEL', str(output), 'key', 10, fields=['summary'], resume=True)
+        output.unlink()
+        with pytest.raises(SystemExit):
+            rj._export_issues('project = RHEL', str(output), 'key', 10, resume=True)
+
+
+def test_transitions_streaming(capsys):
+    rj = _easyjira_for_unit_test()
+    issues = [_issue_with_history('RHELPLAN-1', 'a', [('2023-01-03T10:00:00.000+0000', 'In Progress'), ('2023-01-20T10:00:00.000+0000', 'Closed')]),
+              _issue_with_history('RHELPLAN-2', 'a', [('2023-01-04T10:00:00.000+0000', 'ON_QA')])]
+    transitions = [t for issue in issues for t in rj._iter_transitions(issue)]
+    assert transitions[0].to_status is transitions[1].from_status
+    rj._print_transitions_changelog(iter(issues))
+    assert json.loads(capsys.readouterr().out) == rj._get_transitions_changelog(issues)
+    rj._print_transitions_changelog(iter([]))
+    assert capsys.readouterr().out == '[]\n'
+    # issues are consumed only once, so a generator of pages works
+    rj._print_transitions_stats(issue for issue in issues)
+    assert capsys.readouterr().out.splitlines() == ['week\tcreated\ttriaged\tbuilt\ttested\tdone',
+                                                    '202301\t6.0\t3.0\t3.0\t0\t0',
+                                                    '202303\t0\t0\t0\t0\t3.0']
+
+
+def test_http_cache(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._http_cache = easyjira.HttpCache(ttl=60, directory=str(tmp_path))
+    url = rj.JIRA_REST_URL + '/issue/RHELPLAN-1'
+    sent = []
+    def fake_send(method, url, **kwargs):
+        sent.append((method, kwargs.get('headers', {}).get('If-None-Match')))
+        if kwargs.get('headers', {}).get('If-None-Match') == '"v1"':
+            return argparse.Namespace(status_code=304, reason='Not Modified', headers={}, content=b'')
+        return argparse.Namespace(status_code=200, reason='OK', headers={'ETag': '"v1"'}, content=b'{"key": "RHELPLAN-1"}')
+    with patch.object(rj, '_send_uncached_request', side_effect=fake_send):
+        assert rj._send_request('get', url, params=None, headers={}).content == b'{"key": "RHELPLAN-1"}'
+        cached = rj._send_request('get', url, params=None, headers={})
+        assert cached.from_cache and rj._response_json(cached) == {'key': 'RHELPLAN-1'}
+        # a new process reads the entry from disk and revalidates it
+        rj._http_cache = easyjira.HttpCache(ttl=60, directory=str(tmp_path))
+        assert rj._send_request('get', url, params=None, headers={}).from_cache
+        rj._send_request('put', url + '/transitions', json={}, headers={})
+        assert not rj._send_request('get', url, params=None, headers={}).__dict__.get('from_cache')
+        # search results and sub-resources of issues are never cached
+        rj._send_request('get', rj.JIRA_REST_URL + '/search', params='jql=x', headers={})
+        rj._send_request('get', rj.JIRA_REST_URL + '/search', params='jql=x', headers={})
+        rj._send_request('get', url + '/transitions', params=None, headers={})
+        rj._send_request('get', url + '/transitions', params=None, headers={})
+    assert sent == [('get', None), ('get', '"v1"'), ('get', '"v1"'), ('put', None), ('get', None), ('get', None), ('get', None), ('get', None), ('get', None)]
+
+
+def test_compressed_files(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._compress = 'gzip'
+    cache_file = str(tmp_path / 'cache' / 'data.json')
+    rj._write_cache_file(cache_file, {'a': 1})
+    with open(cache_file, 'rb') as f:
+        assert f.read(2) == easyjira.GZIP_MAGIC
+    assert rj._read_cache_file(cache_file) == {'a': 1}
+    # appended members are read as one stream and plain files are read as they are
+    output = str(tmp_path / 'export.ndjson.gz')
+    with open(output, 'wb') as f:
+        f.write(rj._compress_bytes(b'{"key": "RHEL-1"}\n'))
+        f.write(rj._compress_bytes(b'{"key": "RHEL-2"}\n'))
+    assert rj._read_exported_keys(output) == {'RHEL-1', 'RHEL-2'}
+    rj._compress = None
+    rj._write_cache_file(cache_file, {'b': 2})
+    assert rj._read_cache_file(cache_file) == {'b': 2}
+
+
+def test_zstd_compressed_files(tmp_path):
+    pytest.importorskip('zstandard')
+    rj = _easyjira_for_unit_test()
+    rj._compress = 'zstd'
+    cache_file = str(tmp_path / 'cache' / 'data.json')
+    rj._write_cache_file(cache_file, {'a': 1})
+    with open(cache_file, 'rb') as f:
+        assert f.read(4) == easyjira.ZSTD_MAGIC
+    opened = []
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+    with patch.object(easyjira, 'open', side_effect=tracking_open, create=True):
+        assert rj._read_cache_file(cache_file) == {'a': 1}
+    assert opened and all(f.closed for f in opened)
+    # appended frames are read as one stream
+    output = str(tmp_path / 'export.ndjson.zst')
+    with open(output, 'wb') as f:
+        f.write(rj._compress_bytes(b'{"key": "RHEL-1"}\n'))
+        f.write(rj._compress_bytes(b'{"key": "RHEL-2"}\n'))
+    assert rj._read_exported_keys(output) == {'RHEL-1', 'RHEL-2'}
+
+
+def test_profiles_and_batch(tmp_path):
+    rj = easyjira.EasyJira()
+    rj._profiles_path = str(tmp_path / 'profiles.ini')
+    with open(rj._profiles_path, 'w') as f:
+        f.write('[staging]\nurl = https://jira.example.com/\ntoken_env = STAGING_TOKEN\nconcurrency = 2\ncache_dir = {}\n'.format(tmp_path / 'staging'))
+    with open(tmp_path / 'commands', 'w') as f:
+        f.write('# comment\n--profile staging query --jql "project = A"\n\nquery --jql "project = B"\n--profile staging query --jql "project = C"\n'
+                '--concurrency 7 --http-cache-ttl 5 --profile staging query --jql "project = D"\n')
+    used = []
+    def fake_query(args):
+        rj._teams_cache.setdefault('queries', []).append(args.jql)
+        used.append((args.jql, rj.JIRA_REST_URL, rj._token_env, rj._concurrency, rj._cache_dir, rj._http_cache, rj._http_cache.ttl))
+    with patch.object(rj, 'cmd_query', side_effect=fake_query):
+        assert rj.main(fake_args=['batch', str(tmp_path / 'commands')]) == 0
+    assert [u[:5] for u in used] == [
+        ('project = A', 'https://jira.example.com/rest/api/2', 'STAGING_TOKEN', 2, str(tmp_path / 'staging')),
+        ('project = B', 'https://issues.redhat.com/rest/api/2', 'JIRA_TOKEN', 4, os.path.expanduser('~/.cache/easyjira')),
+        ('project = C', 'https://jira.example.com/rest/api/2', 'STAGING_TOKEN', 2, str(tmp_path / 'staging')),
+        ('project = D', 'https://jira.example.com/rest/api/2', 'STAGING_TOKEN', 7, str(tmp_path / 'staging'))]
+    # each profile keeps its own cache across commands, options of every command are applied
+    assert used[0][5] is used[2][5] is used[3][5] and used[0][5] is not used[1][5]
+    assert [u[6] for u in used] == [60, 60, 60, 5]
+    assert rj._profiles['staging']['teams_cache']['queries'] == ['project = A', 'project = C', 'project = D']
+    assert rj._profiles[None]['teams_cache']['queries'] == ['project = B']
+    with pytest.raises(SystemExit):
+        rj.main(fake_args=['--profile', 'missing', 'query', '--jql', 'x'])
+
+
+def test_local_jql(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._cache_dir = str(tmp_path)
+    store = rj._get_issue_store()
+    store.put([_sample_issue('RHELPLAN-1', 'New', ['ux']),
+               _sample_issue('RHELPLAN-2', 'In Progress', ['ux', 'perf'], assignee={'name': 'alice'}),
+               _sample_issue('RHELPLAN-10', 'In Progress', [], parent={'key': 'RHELPLAN-1'}, updated='2023-03-02T10:00:00.000+0000'),
+               _sample_issue('RHEL-5', 'Closed', ['ux'], customfield_12311140='RHELPLAN-1')])
+    # storing a newer version replaces the old one including its labels
+    store.put([_sample_issue('RHEL-5', 'Closed', [], customfield_12311140='RHELPLAN-1')])
+    # stored issues are used only after a full sync of the projects or the query
+    assert rj._search_local('project = RHELPLAN') is None
+    rj._record_store_sync('project in (RHELPLAN, RHEL) ORDER BY key', store, time.time())
+    keys = lambda jql: [issue['key'] for issue in rj._search_local(jql)]
+    assert keys('project = RHELPLAN AND status = "in progress"') == ['RHELPLAN-10', 'RHELPLAN-2']
+    assert keys("project in (RHEL, RHELPLAN) AND labels = ux AND assignee in (jdoe, 'alice') ORDER BY key ASC") == ['RHELPLAN-1', 'RHELPLAN-2']
+    assert keys('labels != perf AND project in (RHEL, RHELPLAN) ORDER BY key') == ['RHELPLAN-1']
+    assert keys('project in (RHEL, RHELPLAN) AND "Epic Link" = RHELPLAN-1') == keys('project = RHEL AND cf[12311140] = RHELPLAN-1') == ['RHEL-5']
+    assert keys('project = RHELPLAN AND updated >= "2023/03/01"') == ['RHELPLAN-10']
+    # queries without a project clause may select issues of projects that were never synced
+    assert rj._search_local('parent = RHELPLAN-1') is None
+    assert rj._search_local('labels = ux') is None
+    rj._record_store_sync('parent = RHELPLAN-1', store, time.time())
+    assert keys('parent  =  RHELPLAN-1 ORDER BY key') == ['RHELPLAN-10']
+    # too old syncs are not trusted
+    store.mark_synced('project:RHEL', time.time() - 120)
+    assert rj._search_local('project = RHEL', max_age=60) is None
+    assert keys('project = RHEL') == ['RHEL-5']
+    assert keys('project in (RHEL, RHELPLAN) AND project not in (RHEL) ORDER BY updated DESC, key')[0] == 'RHELPLAN-10'
+    assert rj._search_local('project not in (RHEL)') is None
+    assert [issue['key'] for issue in rj._search_local('project = RHELPLAN ORDER BY key', max_results=1, start_at=1)] == ['RHELPLAN-2']
+    # projects are matched by key and name, projects without stored issues are asked on the server
+    store.put([_sample_issue('RHELPLAN-3', 'New', [], project={'key': 'RHELPLAN', 'name': 'RHEL Planning'})])
+    assert keys('project = "RHEL Planning" ORDER BY key') == ['RHELPLAN-1', 'RHELPLAN-2', 'RHELPLAN-3', 'RHELPLAN-10']
+    assert keys('project in (RHEL, "rhel planning") AND status = New ORDER BY key') == ['RHELPLAN-1', 'RHELPLAN-3']
+    assert keys('project in (RHEL, RHELPLAN) AND project != "RHEL Planning"') == ['RHEL-5']
+    assert rj._search_local('project = OTHER') is None
+    assert rj._search_local('project in (RHEL, OTHER)') is None
+    store.delete(['RHELPLAN-3'])
+    for jql in ('status = New OR status = Closed', 'assignee = currentUser()', 'assignee is EMPTY',
+                'summary ~ text', 'labels > ux', 'project = RHEL ORDER BY labels', 'updated > startOfWeek()'):
+        assert rj._search_local(jql) is None, jql
+    # issues stored without changelog cannot answer queries that need it
+    assert rj._search_local('project = RHEL', expand='changelog') is None
+    # issues read with only some fields do not replace complete stored issues
+    args = argparse.Namespace(id=None, jql='project = RHEL', from_url=None, auto_paginate=False, max_results=100, start_at=0,
+                              expand=None, cache=False, store=True, changelog_endpoint=False)
+    def fake_pages(jql, max_results=None, start_at=0, expand=None, fields=None):
+        yield [{'key': 'RHEL-5', 'fields': {'summary': 'partial'}}] if fields else [_sample_issue('RHEL-5', 'New', [])]
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_pages):
+        list(rj._iter_query_pages(args, fields=['summary']))
+        assert store.get('RHEL-5')['fields']['status']['name'] == 'Closed'
+        list(rj._iter_query_pages(args))
+    assert keys('status = New AND project = RHEL') == ['RHEL-5']
+
+
+def test_issue_store_upgrade(tmp_path):
+    path = str(tmp_path / 'issues.sqlite')
+    with sqlite3.connect(path) as db:
+        db.execute('CREATE TABLE issues (key TEXT PRIMARY KEY COLLATE NOCASE, project TEXT COLLATE NOCASE, key_number INTEGER,'
+                   ' status TEXT COLLATE NOCASE, assignee TEXT COLLATE NOCASE, parent TEXT COLLATE NOCASE,'
+                   ' epic TEXT COLLATE NOCASE, created REAL, updated REAL, data TEXT)')
+        db.execute('INSERT INTO issues (key, project, key_number, data) VALUES (?, ?, ?, ?)', ('RHEL-1', 'RHEL', 1, '{"key": "RHEL-1"}'))
+    store = easyjira.IssueStore(path)
+    assert store.project_keys('RHEL') == ['RHEL'] and store.project_keys('Red Hat Enterprise Linux') == ['Red Hat Enterprise Linux']
+    store.put([_sample_issue('RHEL-2', project={'key': 'RHEL', 'name': 'Red Hat Enterprise Linux'})])
+    # once the name is known, it matches also issues stored before
+    assert [issue['key'] for issue in store.search([('project', '=', ['Red Hat Enterprise Linux'])])] == ['RHEL-2', 'RHEL-1']
+
+
+def test_errata(capsys):
+    rj = _easyjira_for_unit_test()
+    issues = [_sample_issue('RHEL-1', labels=['CVE-2023-1234', 'flaw:bz#100'], summary='CVE-2023-1234 openssl: flaw [rhel-9.2.0]'),
+              _sample_issue('RHEL-2', labels=['CVE-2023-1234', 'CVE-2022-99', 'flaw:bz#100', 'flaw:bz#90'], summary='CVE-2022-99 CVE-2023-1234 openssl: flaw [rhel-8.8.0]'),
+              _sample_issue('RHEL-3', labels=['CVE-2023-1234', 'flaw:bz#100'], summary='CVE-2023-1234 openssl: flaw [rhel-9.2.0]'),
+              _sample_issue('RHEL-3', labels=['CVE-2023-1234', 'flaw:bz#100'], summary='CVE-2023-1234 openssl: flaw [rhel-9.2.0]'),
+              _sample_issue('RHEL-4', labels=['flaw:bz#200'], summary='zlib: other flaw [rhel-9.2.0]'),
+              _sample_issue('RHEL-6', labels=['flaw:bz#1000'], summary='zlib: next flaw [rhel-9.2.0]')]
+    rj._print_errata(issues)
+    assert capsys.readouterr().out.splitlines() == [
+        'CVE-2022-99\topenssl: flaw (CVE-2022-99)\t90 100\trhel-8.8.0\tRHEL-2',
+        'CVE-2023-1234\topenssl: flaw (CVE-2023-1234)\t90 100\trhel-8.8.0 rhel-9.2.0\tRHEL-1 RHEL-2 RHEL-3',
+        'bz#200\t\t200\trhel-9.2.0\tRHEL-4',
+        'bz#1000\t\t1000\trhel-9.2.0\tRHEL-6']
+    # composite fields use the same parsing
+    rj._add_composite_fields(issues[1])
+    assert issues[1]['fields']['errata_description'] == 'openssl: flaw (CVE-2023-1234 CVE-2022-99)'
+
+
+def test_listen_webhooks(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._cache_dir = str(tmp_path)
+    issue = _sample_issue('RHELPLAN-1', 'New', ['ux'])
+    rj._get_issue_store().put([dict(issue, changelog={'histories': []})])
+    rj._record_store_sync('project = RHELPLAN', rj._get_issue_store(), time.time())
+    rj._write_cache_file(str(tmp_path / 'changelog' / 'RHELPLAN-1.json'), {'updated': issue['fields']['updated'], 'histories': []})
+    server = rj._create_webhook_server('127.0.0.1', 0, secret='s3')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/?secret=s3'
+    def post(payload, url=url):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            return urllib.request.urlopen(request).status
+        except urllib.error.HTTPError as e:
+            return e.code
+    try:
+        updated = _sample_issue('RHELPLAN-1', 'In Progress', ['ux'], updated='2023-02-03T10:00:00.000+0000')
+        status_change = {'field': 'status', 'fromString': 'New', 'toString': 'In Progress'}
+        assert post({'webhookEvent': 'jira:issue_updated', 'issue': updated, 'changelog': {'items': [status_change]}}) == 204
+        assert post({'webhookEvent': 'jira:issue_created', 'issue': _sample_issue('RHELPLAN-2', 'New', ['ux'])}) == 204
+        # an older event arriving late is ignored
+        assert post({'webhookEvent': 'jira:issue_updated', 'issue': issue}) == 204
+        assert post({'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'RHELPLAN-2'}}, url=url.replace('s3', 'wrong')) == 403
+        # malformed and oversized bodies are refused
+        assert post(b'{"webhookEvent": ') == 400
+        assert post(b'\xff\xfe') == 400
+        assert post([]) == 400
+        with patch.object(easyjira.WebhookHandler, 'MAX_BODY_SIZE', 10):
+            assert post({'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'RHELPLAN-2'}}) == 413
+        assert [i['key'] for i in rj._search_local('project = RHELPLAN AND labels = ux ORDER BY key')] == ['RHELPLAN-1', 'RHELPLAN-2']
+        assert post({'webhookEvent': 'jira:issue_deleted', 'issue': {'key': 'RHELPLAN-2'}}) == 204
+    finally:
+        server.shutdown()
+        server.server_close()
+    stored = rj._get_issue_store().get('RHELPLAN-1')
+    assert stored['fields']['status']['name'] == 'In Progress'
+    assert stored['changelog']['histories'] == [{'created': '2023-02-03T10:00:00.000+0000', 'items': [status_change]}]
+    assert [i['key'] for i in rj._search_local('project = RHELPLAN AND labels = ux')] == ['RHELPLAN-1']
+    assert rj._get_status_changelog('RHELPLAN-1', '2023-02-03T10:00:00.000+0000') == stored['changelog']['histories']
+
+
+def test_named_queries(tmp_path, capsys):
+    rj = _easyjira_for_unit_test()
+    query_file = tmp_path / 'queries'
+    query_file.write_text('# dashboard\nnew = status = New ORDER BY key\n')
+    queries = rj._read_named_queries(['ux=labels = ux'], str(query_file))
+    assert queries == {'ux': 'labels = ux', 'new': 'status = New ORDER BY key'}
+    matches = {'labels = ux': ['RHEL-2', 'RHEL-1'], 'status = New ORDER BY key': ['RHEL-1', 'RHEL-3']}
+    searched = []
+    def fake_search(jql, max_results=None, start_at=0, expand=None, fields=None):
+        searched.append(jql)
+        if jql in matches:
+            yield [{'key': key} for key in matches[jql]]
+        else:
+            keys = sorted(re.search(r'key in \((.*)\)', jql).group(1).split(','))
+            yield [_sample_issue(key) for key in keys]
+    args = argparse.Namespace(auto_paginate=False, max_results=100, expand=None, output_format=None, output_dir=None)
+    with patch.object(rj, '_iter_search_pages', side_effect=fake_search), patch.object(rj, '_get_field_catalog', return_value={'status': 'status'}):
+        rj._print_named_queries(queries, args)
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [(line['query'], line['key']) for line in lines] == [('ux', 'RHEL-2'), ('ux', 'RHEL-1'), ('new', 'RHEL-1'), ('new', 'RHEL-3')]
+        # every distinct issue is fetched once
+        assert searched[2:] == ['key in (RHEL-1,RHEL-2,RHEL-3)']
+        args.output_dir = str(tmp_path / 'out')
+        args.output_format = '{key} {fields[status][name]}'
+        rj._print_named_queries(queries, args)
+    assert (tmp_path / 'out' / 'ux.txt').read_text() == 'RHEL-2 New\nRHEL-1 New\n'
+    assert (tmp_path / 'out' / 'new.txt').read_text() == 'RHEL-1 New\nRHEL-3 New\n'
+    with pytest.raises(SystemExit):
+        rj._read_named_queries(['no query'], None)
+
+
+def test_field_catalog(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._cache_dir = str(tmp_path)
+    catalog = [{'id': 'summary', 'name': 'Summary', 'custom': False}, {'id': 'customfield_1', 'name': 'Story Points', 'custom': True},
+               {'id': 'customfield_2', 'name': 'Release/Note Type', 'custom': True}, {'id': 'customfield_3', 'name': 'summary', 'custom': True},
+               {'id': 'statuscategorychangedate', 'name': 'Status Category Changed', 'custom': False}]
+    requests_made = []
+    def fake_request(method, url, **kwargs):
+        requests_made.append(url)
+        return argparse.Namespace(ok=True, content=json.dumps(catalog).encode('utf-8'))
+    with patch.object(rj, '_api_request', side_effect=fake_request):
+        # composite fields, AUTO_CUSTOM_FIELDS and custom field ids do not need the catalog
+        assert rj._resolve_output_format('{key} {fields[customfield_9]} {fields[status_text]} {fields[Sprint]}') == '{key} {fields[customfield_9]} {fields[status_text]} {fields[customfield_12310940]}'
+        assert requests_made == []
+        # system fields are known from the catalog, including ones specific to the server
+        assert rj._resolve_field_names(['summary', 'status_category_changed']) == ['summary', 'statuscategorychangedate']
+        output_format = rj._resolve_output_format('{{{key}}}\t{fields[Story Points]:>5} {fields[release_note_type]!r} {fields[unknown]}')
+        assert output_format == '{{{key}}}\t{fields[customfield_1]:>5} {fields[customfield_2]!r} {fields[unknown]}'
+        assert rj._resolve_field_names(['summary', 'story points ', 'Release/Note Type']) == ['summary', 'customfield_1', 'customfield_2']
+        with pytest.raises(SystemExit):
+            rj._resolve_field_names(['unknown'])
+        # the catalog is cached on disk and read once per process
+        rj._field_catalogs = {}
+        assert rj._resolve_field_name('story_points') == 'customfield_1'
+    assert requests_made == [rj.JIRA_REST_URL + '/field']
+    issue = _sample_issue('RHEL-1', customfield_1=5.0, customfield_2='Bug Fix', unknown='x')
+    assert output_format.format(**issue) == "{RHEL-1}\t  5.0 'Bug Fix' x"
+
+
+def test_workers_output(capsys):
+    rj = _easyjira_for_unit_test()
+    def pages():
+        return [[_issue_with_history(f'RHEL-{page}{i}', 'comp', [('2023-02-0{}T10:00:00.000+0000'.format(i + 1), 'In Progress'), ('2023-03-01T10:00:00.000+0000', 'Closed')])
+                 for i in range(3)] for page in range(1, 6)]
+    output_format = '{key}\t{fields[status_text]}\t{fields[errata_description]}'
+    for options in ({'ndjson': True}, {'raw': True}, {'transitions_changelog': True}, {'transitions_stats': True}, {}):
+        args = argparse.Namespace(**dict({'raw': False, 'ndjson': False, 'transitions_changelog': False, 'transitions_stats': False, 'workers': 2}, **options))
+        rj._print_pages_in_processes(pages(), args, output_format)
+        parallel = capsys.readouterr().out
+        issues = (issue for page in pages() for issue in page)
+        if args.raw:
+            rj._print_raw_issues(issues)
+        elif args.ndjson:
+            rj._print_ndjson_issues(issues)
+        elif args.transitions_changelog:
+            rj._print_transitions_changelog(issues)
+        elif args.transitions_stats:
+            rj._print_transitions_stats(issues)
+        else:
+            rj._print_issues(output_format, issues)
+        assert parallel == capsys.readouterr().out, options
+
+
+def test_metrics(tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj._retries = 1
+    responses = [argparse.Namespace(status_code=429, headers={'Retry-After': '0'}), argparse.Namespace(status_code=200, headers={'ETag': '"v1"'}, reason='OK', content=b'{}'),
+                 argparse.Namespace(status_code=304, headers={}, reason='Not Modified', content=b'')]
+    session = argparse.Namespace(request=lambda method, url, **kwargs: responses.pop(0))
+    url = rj.JIRA_REST_URL + '/issue/RHELPLAN-1'
+    with patch.object(rj, '_get_session', return_value=session):
+        rj._send_request('get', url, params=None, headers={})
+        rj._send_request('get', url, params=None, headers={})
+    metrics = rj._metrics
+    assert metrics.total('easyjira_api_requests_total') == 3
+    assert metrics.total('easyjira_api_requests_total', status=429) == 1
+    assert metrics.total('easyjira_api_retries_total') == 1
+    assert metrics.total('easyjira_cache_lookups_total', cache='http', result='revalidated') == 1
+    assert metrics.quantile('easyjira_api_request_duration_seconds', 0.95) == 0.05
+    text = metrics.render()
+    assert '# TYPE easyjira_api_requests_total counter\n' in text
+    assert 'easyjira_api_requests_total{method="get",status="200"} 1\n' in text
+    assert 'easyjira_api_request_duration_seconds_bucket{method="get",le="+Inf"} 3\n' in text
+    assert 'easyjira_api_request_duration_seconds_count{method="get"} 3\n' in text
+    assert '3 requests' in metrics.progress_line() and 'http cache hits 1/2' in metrics.progress_line()
+    rj._write_metrics_file(str(tmp_path / 'easyjira.prom'))
+    assert (tmp_path / 'easyjira.prom').read_text() == text
+    server = rj._start_metrics_server('127.0.0.1', 0)
+    try:
+        assert urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics').read().decode('utf-8') == text
+    finally:
+        server.shutdown()
+        server.server_close()
+    # failed connections are counted next to status codes
+    rj._metrics = easyjira.Metrics()
+    def request(method, url, **kwargs):
+        if url.endswith('RHELPLAN-2'):
+            raise easyjira.requests.ConnectionError('refused')
+        return argparse.Namespace(status_code=200, headers={}, reason='OK', content=b'{}')
+    with patch.object(rj, '_get_session', return_value=argparse.Namespace(request=request)):
+        rj._send_uncached_request('get', url)
+        with pytest.raises(easyjira.requests.ConnectionError):
+            rj._send_uncached_request('get', rj.JIRA_REST_URL + '/issue/RHELPLAN-2')
+    text = rj._metrics.render()
+    assert 'easyjira_api_requests_total{method="get",status="200"} 1\n' in text
+    assert 'easyjira_api_requests_total{method="get",status="error"} 1\n' in text
+    assert rj._metrics.total('easyjira_api_requests_total', status=200) == 1
+    assert '2 requests' in rj._metrics.progress_line() and '1 errors' in rj._metrics.progress_line()
+    # 503 is retried for GET, not for POST that could have been processed
+    sent = []
+    def unavailable(method, url, **kwargs):
+        sent.append(method)
+        return argparse.Namespace(status_code=503 if len(sent) % 2 else 201, headers={'Retry-After': '0'}, reason='', content=b'{}')
+    with patch.object(rj, '_get_session', return_value=argparse.Namespace(request=unavailable)):
+        assert rj._send_uncached_request('get', url).status_code == 201
+        assert rj._send_uncached_request('post', rj.JIRA_REST_URL + '/issue/bulk').status_code == 503
+    assert sent == ['get', 'get', 'post']
+
+
+def test_clone_rows_bulk(capsys, tmp_path):
+    rj = _easyjira_for_unit_test()
+    rj.BULK_SIZE = 2
+    rows_file = tmp_path / 'teams.csv'
+    rows_file.write_text('team\na\nb\nc\n')
+    original = _sample_issue('RHELMISC-1', summary='Task for x', description='desc',
+                             project={'key': 'RHELMISC'}, issuetype={'name': 'Task'}, duedate=None, priority=None,
+                             customfield_12311140=None)
+    posted = []
+    def fake_request(method, url, **kwargs):
+        summaries = [item['fields']['summary'] for item in kwargs['json']['issueUpdates']]
+        posted.append(summaries)
+        body = {'issues': [{'key': 'RHELMISC-1' + summary[-1]} for summary in summaries if summary != 'Task for c'],
+                'errors': [{'failedElementNumber': index, 'elementErrors': {'errors': {'summary': 'bad'}}} for index, summary in enumerate(summaries) if summary == 'Task for c']}
+        return argparse.Namespace(ok=True, content=json.dumps(body).encode('utf-8'))
+    args = argparse.Namespace(id='RHELMISC-1', set=None, re='{"summary": {"pattern": "x", "replacement": "$team"}}', rows=str(rows_file),
+                              copy_fields=None, no_link_back=True, raw=False, output_format='{key} {fields[summary]}')
+    with patch.object(rj, '_get_issue', return_value=original), patch.object(rj, '_api_request', side_effect=fake_request), \
+         patch.object(rj, '_search_issues_by_keys', side_effect=lambda keys: [_sample_issue(key) for key in keys]), \
+         patch.object(rj, '_get_field_catalog', return_value={'summary': 'summary'}):
+        assert rj._create_issues_bulk([{'fields': {'summary': f'Task for {team}'}} for team in 'cab']) == [None, 'RHELMISC-1a', 'RHELMISC-1b']
+        rj.cmd_clone(args)
+    assert sorted(posted[-2:]) == [['Task for a', 'Task for b'], ['Task for c']]
+    out = capsys.readouterr().out.splitlines()
+    # failed items are reported by their index in all rows, not in the chunk
+    assert sorted(out[:2]) == ["WARNING: Issue #0 NOT created: {'errors': {'summary': 'bad'}}", "WARNING: Issue #2 NOT created: {'errors': {'summary': 'bad'}}"]
+    assert out[2:] == ['RHELMISC-1a Summary of RHELMISC-1a', 'RHELMISC-1b Summary of RHELMISC-1b']
+    # a rejected request is an error, not zero created issues
+    with patch.object(rj, '_api_request', return_value=argparse.Namespace(ok=False, reason='Server Error', text='', content=b'oops')):
+        with pytest.raises(SystemExit):
+            rj._create_issues_bulk([{'fields': {}}])
+
+
 if __name__ == '__main__':
     # this is here for debugging purposes to see how adoc is parsed
     # normally this file is run by 'pytest' command